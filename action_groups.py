@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+# Los archivos .d6a son bases SQLite con una tabla ActionGroup:
+# Index, Time (ms), Servo1 ... ServoN (pulso de cada servo)
+SERVO_COUNT = 6
+
+
+# Grupo de acciones en memoria: tiempos y cuadros en arreglos compactos
+class ActionGroup:
+    __slots__ = ("path", "mtime", "servos", "times", "frames")
+
+    def __init__(self, path, mtime, servos, times, frames):
+        self.path = path
+        self.mtime = mtime
+        self.servos = servos
+        self.times = times
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.times)
+
+    # Duración total de la seña en segundos, según los tiempos de sus cuadros
+    @property
+    def duration(self):
+        return sum(self.times) / 1000.0
+
+    # Pulsos de todos los servos en el cuadro i
+    def frame(self, i):
+        start = i * self.servos
+        return self.frames[start:start + self.servos]
+
+
+# Lee un archivo .d6a y lo convierte en un ActionGroup
+def parse_action_group(path, servos=SERVO_COUNT):
+    mtime = os.stat(path).st_mtime_ns
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("select * from ActionGroup order by [Index]").fetchall()
+    finally:
+        conn.close()
+
+    times = array("I")
+    frames = array("H")
+    for row in rows:
+        times.append(int(row[1]))
+        frames.extend(int(p) for p in row[2:2 + servos])
+    return ActionGroup(path, mtime, servos, times, frames)
+
+
+# Caché de grupos de acciones. Revisa el mtime del archivo como máximo
+# cada `check_interval` segundos y lo vuelve a leer si cambió.
+class ActionGroupCache:
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self._groups = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def preload(self, paths):
+        for path in paths:
+            try:
+                self.get(path)
+            except (OSError, sqlite3.Error) as e:
+                print(f"⚠️ No se pudo cargar {path}: {e}")
+
+    def get(self, path):
+        now = time.monotonic()
+        with self._lock:
+            group = self._groups.get(path)
+            if group is not None and now - self._checked[path] < self.check_interval:
+                return group
+
+        mtime = os.stat(path).st_mtime_ns
+        if group is None or group.mtime != mtime:
+            reloading = group is not None
+            group = parse_action_group(path)
+            if reloading:
+                print(f"🔄 Seña recargada: {path}")
+
+        with self._lock:
+            self._groups[path] = group
+            self._checked[path] = now
+        return group
+
@@ -0,0 +1,235 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+
+from scheduler import HandScheduler
+from servo_backend import VirtualBackend
+from sign2talk import SignPlayer, load_signs, sign_duration
+
+# Benchmark de la reproducción de punta a punta con el backend virtual:
+# reproduce mensajes MQTT grabados y mide la latencia de cada frase,
+# las señas por minuto y el tiempo muerto entre señas.
+#
+#   python bench_playback.py --payloads bench_payloads.jsonl --hands 2
+#
+# Sin --signs-* se generan grupos de acciones sintéticos.
+
+# Señas y letras de la biblioteca sintética
+WORD_SIGNS = ["hola", "gracias", "si", "no", "te_quiero", "corazon", "dedo", "permiso", "adios"]
+LETTER_SIGNS = list("abcdefghijklmnopqrstuvwxyz") + ["ll", "rr"]
+
+# Señas que también tiene la otra mano (se ejecutan con ambas)
+TWO_HAND_SIGNS = [
+    "w", "k", "m", "n", "x", "ll", "z", "s", "t", "j", "p", "r", "i", "v", "q",
+    "l", "y", "o", "u", "rr", "permiso", "corazon", "no", "gracias", "si",
+]
+
+
+# Crea un archivo .d6a con la misma tabla que usa el uHandPi
+def write_action_group(path, frames):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(
+            "create table ActionGroup([Index] integer primary key, Time int, "
+            "Servo1 int, Servo2 int, Servo3 int, Servo4 int, Servo5 int, Servo6 int)"
+        )
+        conn.executemany(
+            "insert into ActionGroup values (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(i + 1, t, *pulses) for i, (t, pulses) in enumerate(frames)],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# Genera una biblioteca de señas sintética y reproducible
+def synth_library(path, names, seed):
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    for name in names:
+        key = f"letter_{name}" if name in LETTER_SIGNS else f"sign_{name}"
+        frames = [
+            (rng.randrange(200, 700, 50), [rng.randrange(500, 2500, 10) for _ in range(6)])
+            for _ in range(rng.randint(2, 4))
+        ]
+        write_action_group(os.path.join(path, f"{key}.d6a"), frames)
+    return path
+
+
+def load_payloads(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# Percentil por rango más cercano
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+# La biblioteca sintética vive en un directorio temporal que se borra al
+# terminar
+def run(args):
+    with tempfile.TemporaryDirectory(prefix="sign2talk_bench_") as tmp:
+        return _run(args, tmp)
+
+
+def _run(args, tmp):
+    left_path = args.signs_left or synth_library(
+        os.path.join(tmp, "izquierda"), WORD_SIGNS + LETTER_SIGNS, args.seed
+    )
+    paths = {"izquierda": left_path}
+    if args.hands == 2:
+        paths["derecha"] = args.signs_right or synth_library(
+            os.path.join(tmp, "derecha"), TWO_HAND_SIGNS, args.seed + 1
+        )
+
+    backends = {name: VirtualBackend(time_scale=args.time_scale) for name in paths}
+    clock = backends["izquierda"]
+    hand_signs = {name: load_signs(path) for name, path in paths.items()}
+
+    lock = threading.Lock()
+    submitted = {}
+    job_done = {}
+    steps = {name: [] for name in paths}
+
+    def on_event(event, hand, job, step):
+        now = clock.now()
+        with lock:
+            if event == "step_start":
+                steps[hand].append([id(job.payload), now, None])
+            elif event == "step_done":
+                steps[hand][-1][2] = now
+            elif event == "job_done":
+                key = id(job.payload)
+                job_done[key] = max(job_done.get(key, now), now)
+
+    scheduler = HandScheduler(
+        hands={name: (signs, SignPlayer(backends[name])) for name, signs in hand_signs.items()},
+        topic_hands={
+            "traductor/mano_izquierda": "izquierda",
+            "traductor/mano_derecha": "derecha" if args.hands == 2 else "izquierda",
+            "traductor/deletrear": "izquierda",
+            "traductor/plan": "izquierda",
+        },
+        duration=sign_duration,
+        queue_size=args.queue_size,
+        policy="block",
+        sleep=clock.sleep,
+        on_event=on_event,
+    )
+
+    messages = load_payloads(args.payloads)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        scheduler.start()
+        start = clock.now()
+        offset = 0.0
+        for rep in range(args.repeat):
+            for message in messages:
+                target = start + offset + message["t"]
+                clock.sleep(target - clock.now())
+                payload = dict(message["payload"])
+                if "id" in payload:
+                    # Cada repetición es un mensaje distinto para el dedup
+                    payload["id"] = f"{payload['id']}-{rep}"
+                submitted[id(payload)] = (clock.now(), payload)
+                scheduler.submit(payload, message["topic"])
+            offset += messages[-1]["t"] + args.gap
+        scheduler.stop()
+        for worker in scheduler.workers.values():
+            worker.join()
+    end = clock.now()
+
+    latencies = [
+        job_done[key] - t for key, (t, _) in submitted.items() if key in job_done
+    ]
+    sign_count = sum(len(s) for s in steps.values())
+    idle = []
+    for hand_steps in steps.values():
+        for prev, nxt in zip(hand_steps, hand_steps[1:]):
+            # Solo cuenta como tiempo muerto si la siguiente seña ya estaba pedida
+            if prev[2] is not None and submitted[nxt[0]][0] <= prev[2]:
+                idle.append(max(0.0, nxt[1] - prev[2]))
+    late_ms = sum(b.late_ms for b in backends.values())
+
+    return {
+        "hands": args.hands,
+        "phrases": len(latencies),
+        "signs": sign_count,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p90": percentile(latencies, 90),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies, default=0.0),
+        "signs_per_minute": sign_count / (end - start) * 60 if end > start else 0.0,
+        "idle_total": sum(idle),
+        "idle_mean": sum(idle) / len(idle) if idle else 0.0,
+        "idle_p95": percentile(idle, 95),
+        "servo_late_ms": late_ms,
+        "wall_time": end - start,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de reproducción de señas")
+    parser.add_argument("--payloads", default="bench_payloads.jsonl",
+                        help="Mensajes grabados (JSONL con t, topic y payload)")
+    parser.add_argument("--hands", type=int, choices=(1, 2), default=2)
+    parser.add_argument("--signs-left", help="Carpeta de señas de la mano izquierda")
+    parser.add_argument("--signs-right", help="Carpeta de señas de la mano derecha")
+    parser.add_argument("--time-scale", type=float, default=0.02,
+                        help="Escala del reloj virtual (0.02 = 50x más rápido)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--gap", type=float, default=5.0,
+                        help="Segundos entre repeticiones de la grabación")
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Guarda el resultado en este archivo")
+    parser.add_argument("--max-p95", type=float,
+                        help="Falla si la latencia p95 (s) supera este valor")
+    parser.add_argument("--min-spm", type=float,
+                        help="Falla si las señas por minuto quedan por debajo")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    print(f"Manos: {result['hands']}  Frases: {result['phrases']}  Señas: {result['signs']}")
+    print(
+        "Latencia por frase (s): "
+        f"p50={result['latency_p50']:.2f} p90={result['latency_p90']:.2f} "
+        f"p95={result['latency_p95']:.2f} p99={result['latency_p99']:.2f} "
+        f"max={result['latency_max']:.2f}"
+    )
+    print(f"Señas por minuto: {result['signs_per_minute']:.1f}")
+    print(
+        f"Tiempo muerto entre señas (s): total={result['idle_total']:.2f} "
+        f"media={result['idle_mean']:.3f} p95={result['idle_p95']:.3f}"
+    )
+    print(f"Retraso de servos acumulado: {result['servo_late_ms']:.0f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    failed = False
+    if args.max_p95 is not None and result["latency_p95"] > args.max_p95:
+        print(f"❌ p95 {result['latency_p95']:.2f}s supera el límite de {args.max_p95:.2f}s")
+        failed = True
+    if args.min_spm is not None and result["signs_per_minute"] < args.min_spm:
+        print(f"❌ {result['signs_per_minute']:.1f} señas/min por debajo de {args.min_spm:.1f}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import argparse
+import time
+
+import numpy as np
+
+from features import NUM_FEATURES, NUM_LANDMARKS
+
+# --- CONFIGURATION ---
+ROTATION_DEGREES = 15.0   # Max rotation around the wrist, in each direction
+SCALE_RANGE = (0.9, 1.1)  # Hand size relative to the recorded sample
+JITTER = 0.004            # Std-dev of per-landmark noise (normalized units)
+MIRROR_PROB = 0.0         # Fraction of copies mirrored (left-handed variants)
+ASPECT = 640 / 480        # Camera width / height: x and y are normalized separately
+
+
+# Rotated, scaled, jittered and mirrored copies of wrist-relative samples.
+# Every transform is one NumPy operation over the whole (n * copies) batch.
+def augment(X, y, copies=10, seed=0, rotation=ROTATION_DEGREES, scale=SCALE_RANGE,
+            jitter=JITTER, mirror_prob=MIRROR_PROB, aspect=ASPECT, include_original=True):
+    rng = np.random.default_rng(seed)
+    X = np.asarray(X, dtype=np.float32).reshape(-1, NUM_LANDMARKS, 2)
+    m = len(X) * copies
+
+    points = np.repeat(X, copies, axis=0)
+    # Work in square pixel-like units so rotations keep the hand's shape
+    points[:, :, 0] *= aspect
+
+    theta = np.radians(rng.uniform(-rotation, rotation, m)).astype(np.float32)
+    cos, sin = np.cos(theta), np.sin(theta)
+    rotation_matrix = np.stack([np.stack([cos, -sin], -1), np.stack([sin, cos], -1)], 1)
+    points = np.einsum('mij,mkj->mki', rotation_matrix, points)
+
+    points *= rng.uniform(scale[0], scale[1], (m, 1, 1)).astype(np.float32)
+
+    if mirror_prob > 0:
+        mirror = rng.random(m) < mirror_prob
+        points[mirror, :, 0] *= -1
+
+    points[:, :, 0] /= aspect
+    points += rng.normal(0.0, jitter, points.shape).astype(np.float32)
+    # Keep the wrist as the origin, like the recorded features
+    points -= points[:, :1, :]
+
+    X_aug = points.reshape(m, NUM_FEATURES)
+    y_aug = np.repeat(np.asarray(y), copies)
+    if include_original:
+        X_aug = np.concatenate([X.reshape(-1, NUM_FEATURES), X_aug])
+        y_aug = np.concatenate([np.asarray(y), y_aug])
+    return X_aug, y_aug
+
+
+def main():
+    from dataset import load_dataset_cached
+
+    parser = argparse.ArgumentParser(description="Generate augmented landmark samples")
+    parser.add_argument('--copies', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mirror-prob', type=float, default=MIRROR_PROB)
+    parser.add_argument('--out', default='hand_data_augmented.npz')
+    args = parser.parse_args()
+
+    X, y, _ = load_dataset_cached()
+    start = time.perf_counter()
+    X_aug, y_aug = augment(X, y, copies=args.copies, seed=args.seed,
+                           mirror_prob=args.mirror_prob)
+    elapsed = time.perf_counter() - start
+    print(f"Generated {len(y_aug)} samples from {len(y)} in {elapsed:.2f}s")
+    np.savez(args.out, X=X_aug, y=y_aug)
+    print(f"Saved to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from features import NUM_FEATURES, NUM_LANDMARKS
+from forest_engine import load_model
+
+# Offline, headless inference over recorded videos and image folders.
+#
+# Sources are split into chunks (a frame range of a video, or a list of
+# images); a process pool decodes each chunk and runs MediaPipe on it, and
+# only the landmark arrays come back to the main process. The classifier
+# then runs once per batch of frames instead of once per frame.
+#
+# Every chunk gets its own MediaPipe instance and starts at an exact frame,
+# so the output depends only on the inputs and --chunk, never on the
+# number of workers or on which worker ran which chunk.
+
+# --- CONFIGURATION ---
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+CHUNK_FRAMES = 300        # Frames (or images) per worker task
+BATCH_SIZE = 1024         # Rows per predict_proba call
+MIN_DETECTION_CONFIDENCE = 0.7
+OUTPUT_FILE = 'predictions.csv'
+
+
+# Fresh MediaPipe instance for one chunk: video mode tracks the hand from
+# frame to frame, so state must not leak between chunks or videos
+def _new_hands(static):
+    import mediapipe as mp
+
+    return mp.solutions.hands.Hands(
+        static_image_mode=static, max_num_hands=1,
+        min_detection_confidence=MIN_DETECTION_CONFIDENCE)
+
+
+def list_images(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+# (source, kind, start, items) tasks for every input path
+def make_tasks(paths, chunk=CHUNK_FRAMES):
+    import cv2
+
+    tasks = []
+    for path in paths:
+        if os.path.isdir(path):
+            images = list_images(path)
+            for start in range(0, len(images), chunk):
+                tasks.append((path, 'images', start, images[start:start + chunk]))
+        else:
+            cap = cv2.VideoCapture(path)
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+            if total <= 0:
+                # Unknown length (some containers): decode it in a single task
+                tasks.append((path, 'video', 0, None))
+                continue
+            for start in range(0, total, chunk):
+                tasks.append((path, 'video', start, min(chunk, total - start)))
+    return tasks
+
+
+# Decoded BGR frames of one task; unreadable images come out as None
+def _frames(source, kind, start, items):
+    import cv2
+
+    if kind == 'images':
+        for path in items:
+            yield cv2.imread(path)
+        return
+    cap = cv2.VideoCapture(source)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+            # Seeking is not frame-accurate for this codec: decode forward
+            cap.release()
+            cap = cv2.VideoCapture(source)
+            for _ in range(start):
+                if not cap.grab():
+                    break
+    count = 0
+    while items is None or count < items:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        count += 1
+        yield frame
+    cap.release()
+
+
+# Worker: decode one chunk and extract landmarks. Returns the landmark
+# points (NaN where no hand was found) and the time spent in each stage.
+def process_chunk(task, flip=True):
+    import cv2
+
+    source, kind, start, items = task
+    hands = _new_hands(static=(kind == 'images'))
+    frames = _frames(source, kind, start, items)
+    end = object()
+
+    points = []
+    decode_s = landmarks_s = 0.0
+    while True:
+        t0 = time.perf_counter()
+        frame = next(frames, end)
+        t1 = time.perf_counter()
+        decode_s += t1 - t0
+        if frame is end:
+            break
+        if frame is None:
+            # Unreadable image: keep its row so frame numbers stay aligned
+            points.append(np.full((NUM_LANDMARKS, 2), np.nan, dtype=np.float32))
+            continue
+
+        # Same orientation as the live detector (predict_v3 mirrors the camera)
+        if flip:
+            frame = cv2.flip(frame, 1)
+        results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        row = np.full((NUM_LANDMARKS, 2), np.nan, dtype=np.float32)
+        if results.multi_hand_landmarks:
+            landmarks = results.multi_hand_landmarks[0].landmark
+            row[:] = [(lm.x, lm.y) for lm in landmarks]
+        points.append(row)
+        landmarks_s += time.perf_counter() - t1
+    hands.close()
+
+    points = np.stack(points) if points else np.empty((0, NUM_LANDMARKS, 2), np.float32)
+    return {
+        'source': source,
+        'start': start,
+        'names': items if kind == 'images' else None,
+        'points': points,
+        'decode_s': decode_s,
+        'landmarks_s': landmarks_s,
+    }
+
+
+# Labels and confidences for every row with a hand, in fixed-size batches
+def classify(model, points, batch_size=BATCH_SIZE):
+    n = len(points)
+    labels = np.full(n, '', dtype=object)
+    confidences = np.zeros(n, dtype=np.float32)
+    found = ~np.isnan(points[:, 0, 0])
+    index = np.flatnonzero(found)
+    # Wrist-relative features for all detected hands at once
+    X = (points[index] - points[index, :1, :]).reshape(-1, NUM_FEATURES)
+    for start in range(0, len(index), batch_size):
+        proba = model.predict_proba(X[start:start + batch_size])
+        best = np.argmax(proba, axis=1)
+        rows = index[start:start + batch_size]
+        labels[rows] = model.classes_[best]
+        confidences[rows] = proba[np.arange(len(best)), best]
+    return labels, confidences, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the sign classifier over videos or image folders")
+    parser.add_argument('inputs', nargs='+', help="Video files and/or directories of images")
+    parser.add_argument('--out', default=OUTPUT_FILE, help="Per-frame predictions (CSV)")
+    parser.add_argument('--summary', metavar='PATH', help="Also write the throughput summary as JSON")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk', type=int, default=CHUNK_FRAMES,
+                        help="Frames per task; hand tracking restarts at every chunk")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--no-flip', action='store_true',
+                        help="Do not mirror frames (predict_v3 mirrors the camera)")
+    args = parser.parse_args()
+
+    try:
+        model = load_model()
+    except FileNotFoundError:
+        print("Error: model.p not found. Train the model first!")
+        exit()
+
+    wall_start = time.perf_counter()
+    tasks = make_tasks(args.inputs, args.chunk)
+    print(f"{len(tasks)} chunks from {len(args.inputs)} inputs, {args.workers} workers")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        chunks = list(pool.map(process_chunk, tasks, [not args.no_flip] * len(tasks)))
+    extract_wall_s = time.perf_counter() - wall_start
+
+    points = np.concatenate([c['points'] for c in chunks]) if chunks else \
+        np.empty((0, NUM_LANDMARKS, 2), np.float32)
+    start = time.perf_counter()
+    labels, confidences, found = classify(model, points, args.batch_size)
+    classify_s = time.perf_counter() - start
+
+    with open(args.out, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['source', 'frame', 'hand', 'label', 'confidence'])
+        row = 0
+        for chunk in chunks:
+            for i in range(len(chunk['points'])):
+                frame = chunk['start'] + i
+                if chunk['names'] is not None:
+                    frame = os.path.basename(chunk['names'][i])
+                writer.writerow([chunk['source'], frame, int(found[row]), labels[row],
+                                 f"{confidences[row]:.4f}" if found[row] else ''])
+                row += 1
+    wall_s = time.perf_counter() - wall_start
+
+    frames = len(points)
+    summary = {
+        'frames': frames,
+        'hands': int(found.sum()),
+        'workers': args.workers,
+        'wall_s': wall_s,
+        'fps': frames / wall_s if wall_s else 0.0,
+        'extract_wall_s': extract_wall_s,
+        # Summed over workers (CPU time spent in each stage)
+        'decode_s': sum(c['decode_s'] for c in chunks),
+        'landmarks_s': sum(c['landmarks_s'] for c in chunks),
+        'classify_s': classify_s,
+        'classify_ms_per_frame': classify_s * 1000 / max(1, int(found.sum())),
+    }
+    print(f"Frames: {frames} ({summary['hands']} with a hand) in {wall_s:.2f}s "
+          f"-> {summary['fps']:.1f} fps")
+    print(f"  decode     {summary['decode_s']:8.2f}s (all workers)")
+    print(f"  landmarks  {summary['landmarks_s']:8.2f}s (all workers)")
+    print(f"  classify   {classify_s:8.3f}s ({summary['classify_ms_per_frame']:.4f} ms/frame)")
+    print(f"Predictions saved to {args.out}")
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
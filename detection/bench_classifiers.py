@@ -0,0 +1,246 @@
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.neighbors import KNeighborsClassifier
+import argparse
+import json
+import os
+import pickle
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from dataset import load_dataset_cached
+from forest_engine import FlatForest, export_forest
+from train_model import RANDOM_STATE, split
+
+# Classifier benchmark: trains every candidate on the same split as
+# train_model.py and measures what matters on the Pi, not just accuracy:
+#   cold load   fresh interpreter -> model loaded -> first prediction
+#   latency     single-sample and batched predict_proba percentiles
+#   footprint   size on disk and peak RSS of the cold-load process
+# The results can be saved as a JSON baseline; a later run against that
+# baseline exits with 1 when a model got slower than the tolerance.
+
+# --- CONFIGURATION ---
+# name -> (kind, factory). kind: 'pickle' (loaded with pickle, needs
+# sklearn) or 'flat' (exported with forest_engine, NumPy only)
+CANDIDATES = {
+    'rf100': ('pickle', lambda: RandomForestClassifier(n_estimators=100, random_state=RANDOM_STATE, n_jobs=1)),
+    'rf25_d12': ('pickle', lambda: RandomForestClassifier(n_estimators=25, max_depth=12,
+                                                          random_state=RANDOM_STATE, n_jobs=1)),
+    'flat_rf100': ('flat', lambda: RandomForestClassifier(n_estimators=100, random_state=RANDOM_STATE, n_jobs=1)),
+    'flat_rf25_d12': ('flat', lambda: RandomForestClassifier(n_estimators=25, max_depth=12,
+                                                             random_state=RANDOM_STATE, n_jobs=1)),
+    'knn5': ('pickle', lambda: KNeighborsClassifier(n_neighbors=5)),
+    'logreg': ('pickle', lambda: LogisticRegression(max_iter=1000)),
+}
+SINGLE_SAMPLES = 500      # Single-sample predictions timed per model
+BATCH_SIZE = 256          # Rows per batched prediction
+BATCH_REPEATS = 20        # Batched predictions timed per model
+COLD_REPEATS = 3          # Fresh-process loads per model (the median is kept)
+TOLERANCE = 0.25          # Allowed latency increase over the baseline (0.25 = 25%)
+# Metrics compared against the baseline
+REGRESSION_METRICS = ('single_p50_ms', 'single_p95_ms', 'batch_p50_ms', 'cold_load_s')
+
+# Runs in a fresh interpreter so imports (numpy, sklearn) count as they do
+# at startup on the Pi. Prints the load time and the peak RSS as JSON.
+COLD_LOAD_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+kind, path, n_features = sys.argv[2], sys.argv[3], int(sys.argv[4])
+import numpy as np
+if kind == 'flat':
+    from forest_engine import FlatForest
+    model = FlatForest.load(path)
+else:
+    import pickle
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+model.predict_proba(np.zeros((1, n_features), dtype=np.float32))
+load_s = time.perf_counter() - start
+# Peak RSS of this process (kB); ru_maxrss would include the forked parent
+with open('/proc/self/status') as f:
+    rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+print(json.dumps({'load_s': load_s, 'rss_mb': rss_kb / 1024}))
+'''
+
+
+def percentiles(times_ms):
+    times_ms = np.asarray(times_ms)
+    return {p: float(np.percentile(times_ms, p)) for p in (50, 95, 99)}
+
+
+# Save the fitted model where `kind` says; returns (path, bytes on disk)
+def save(model, kind, directory):
+    if kind == 'flat':
+        path = os.path.join(directory, 'model_flat')
+        export_forest(model, path)
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    else:
+        path = os.path.join(directory, 'model.p')
+        with open(path, 'wb') as f:
+            pickle.dump(model, f)
+        size = os.path.getsize(path)
+    return path, size
+
+
+def load(kind, path):
+    if kind == 'flat':
+        return FlatForest.load(path)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def cold_load(kind, path, n_features, repeats=COLD_REPEATS):
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, '-c', COLD_LOAD_SCRIPT, here, kind, path, str(n_features)],
+                             check=True, capture_output=True, text=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return (float(np.median([r['load_s'] for r in runs])),
+            float(max(r['rss_mb'] for r in runs)))
+
+
+def single_sample_times(predict_proba, X, n=SINGLE_SAMPLES):
+    predict_proba(X[:1])  # Warm-up
+    times = []
+    for i in range(n):
+        sample = X[i % len(X):i % len(X) + 1]
+        start = time.perf_counter()
+        predict_proba(sample)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def batch_times(predict_proba, X, batch_size=BATCH_SIZE, repeats=BATCH_REPEATS):
+    batch = np.resize(X, (batch_size, X.shape[1]))
+    predict_proba(batch)  # Warm-up
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_proba(batch)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+# Train, save, reload and measure one candidate
+def benchmark(name, X_train, X_test, y_train, y_test, args):
+    kind, factory = CANDIDATES[name]
+    start = time.perf_counter()
+    model = factory().fit(X_train, y_train)
+    train_s = time.perf_counter() - start
+
+    directory = tempfile.mkdtemp(prefix='bench_')
+    try:
+        path, disk_bytes = save(model, kind, directory)
+        # Measure the model as it is loaded at runtime, not the fitted object
+        model = load(kind, path)
+        accuracy = accuracy_score(y_test, model.predict(X_test))
+        cold_s, rss_mb = cold_load(kind, path, X_test.shape[1], args.cold_repeats)
+        single = percentiles(single_sample_times(model.predict_proba, X_test, args.samples))
+        batch = percentiles(batch_times(model.predict_proba, X_test, args.batch_size, args.batch_repeats))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'name': name,
+        'kind': kind,
+        'accuracy': float(accuracy),
+        'train_s': train_s,
+        'cold_load_s': cold_s,
+        'peak_rss_mb': rss_mb,
+        'disk_kb': disk_bytes / 1024,
+        'single_p50_ms': single[50],
+        'single_p95_ms': single[95],
+        'single_p99_ms': single[99],
+        'batch_p50_ms': batch[50],
+        'batch_p95_ms': batch[95],
+        'batch_us_per_sample': batch[50] * 1000 / args.batch_size,
+    }
+
+
+def print_table(results):
+    print(f"{'model':<14} {'acc %':>6} {'cold s':>7} {'rss MB':>7} {'disk KB':>8} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'batch ms':>9} {'us/smp':>7}")
+    for r in results:
+        print(f"{r['name']:<14} {r['accuracy'] * 100:>6.2f} {r['cold_load_s']:>7.2f} "
+              f"{r['peak_rss_mb']:>7.1f} {r['disk_kb']:>8.0f} {r['single_p50_ms']:>7.3f} "
+              f"{r['single_p95_ms']:>7.3f} {r['single_p99_ms']:>7.3f} "
+              f"{r['batch_p50_ms']:>9.2f} {r['batch_us_per_sample']:>7.1f}")
+
+
+# Metrics that got slower than `tolerance` over the baseline
+def regressions(results, baseline, tolerance):
+    previous = {r['name']: r for r in baseline['results']}
+    found = []
+    for r in results:
+        old = previous.get(r['name'])
+        if old is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            if old.get(metric) and r[metric] > old[metric] * (1 + tolerance):
+                found.append((r['name'], metric, old[metric], r[metric]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark candidate sign classifiers")
+    parser.add_argument('--models', nargs='+', default=list(CANDIDATES), choices=list(CANDIDATES))
+    parser.add_argument('--samples', type=int, default=SINGLE_SAMPLES)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--batch-repeats', type=int, default=BATCH_REPEATS)
+    parser.add_argument('--cold-repeats', type=int, default=COLD_REPEATS)
+    parser.add_argument('--save-baseline', metavar='FILE', help="Write the results as a JSON baseline")
+    parser.add_argument('--baseline', metavar='FILE', help="Exit with 1 if slower than this baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="Allowed latency increase over the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    try:
+        X, y, key = load_dataset_cached()
+    except FileNotFoundError:
+        print("Error: no recorded data found. Run record_data.py first!")
+        exit()
+    X_train, X_test, y_train, y_test = split(np.asarray(X), np.asarray(y))
+    print(f"Loaded {len(y)} samples ({len(y_train)} train / {len(y_test)} test) on {platform.machine()}")
+
+    results = []
+    for name in args.models:
+        print(f"Benchmarking {name}...")
+        results.append(benchmark(name, X_train, X_test, y_train, y_test, args))
+    print_table(results)
+
+    report = {
+        'dataset': key,
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'batch_size': args.batch_size,
+        'results': results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to '{args.save_baseline}'")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != report['machine']:
+            print(f"Warning: baseline recorded on {baseline.get('machine')}, running on {report['machine']}")
+        found = regressions(results, baseline, args.tolerance)
+        for name, metric, old, new in found:
+            print(f"REGRESSION {name} {metric}: {old:.4f} -> {new:.4f} (+{(new / old - 1) * 100:.0f}%)")
+        if found:
+            sys.exit(1)
+        print(f"No latency regressions over '{args.baseline}' (tolerance {args.tolerance * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
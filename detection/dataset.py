@@ -0,0 +1,162 @@
+import csv
+import glob
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from features import NUM_FEATURES, NUM_LANDMARKS
+
+# --- CONFIGURATION ---
+CSV_FILE = 'hand_data.csv'
+SHARD_DIR = 'hand_data'
+SHARD_PATTERN = 'shard_*.npz'
+LABEL_DTYPE = '<U8'
+CACHE_DIR = '.cache'
+
+
+def csv_header():
+    # Header: label, then 42 coordinates (21 points * x,y)
+    header = ['label']
+    for i in range(NUM_LANDMARKS):
+        header.extend([f'x{i}', f'y{i}'])
+    return header
+
+
+def list_shards(directory=SHARD_DIR):
+    return sorted(glob.glob(os.path.join(directory, SHARD_PATTERN)))
+
+
+def _next_shard_index(directory):
+    indices = [int(m.group(1)) for path in list_shards(directory)
+               if (m := re.search(r'shard_(\d+)\.npz$', path))]
+    return max(indices, default=0) + 1
+
+
+# Preallocated in-memory buffer of samples, flushed to disk in batches as
+# numbered .npz shards (X: float32 features, y: labels). New recordings
+# only ever add shards, so the set is appendable.
+class SampleBuffer:
+    def __init__(self, directory=SHARD_DIR, capacity=512):
+        self.directory = directory
+        self.features = np.empty((capacity, NUM_FEATURES), dtype=np.float32)
+        self.labels = np.empty(capacity, dtype=LABEL_DTYPE)
+        self.size = 0
+        self.flushed = 0
+        os.makedirs(directory, exist_ok=True)
+        self._next_index = _next_shard_index(directory)
+
+    @property
+    def capacity(self):
+        return len(self.labels)
+
+    def append(self, label, features):
+        self.features[self.size] = np.asarray(features).reshape(-1)
+        self.labels[self.size] = label
+        self.size += 1
+        if self.size == self.capacity:
+            self.flush()
+
+    def flush(self):
+        if self.size == 0:
+            return None
+        path = os.path.join(self.directory, f'shard_{self._next_index:05d}.npz')
+        tmp = path + '.tmp'
+        # Write to a temp file first so a crash never leaves a half shard
+        with open(tmp, 'wb') as f:
+            np.savez(f, X=self.features[:self.size], y=self.labels[:self.size])
+        os.replace(tmp, path)
+        self._next_index += 1
+        self.flushed += self.size
+        self.size = 0
+        return path
+
+
+def load_shards(directory=SHARD_DIR):
+    X_parts, y_parts = [], []
+    for path in list_shards(directory):
+        with np.load(path) as shard:
+            X_parts.append(shard['X'])
+            y_parts.append(shard['y'].astype(LABEL_DTYPE))
+    if not X_parts:
+        return np.empty((0, NUM_FEATURES), dtype=np.float32), np.empty(0, dtype=LABEL_DTYPE)
+    return np.concatenate(X_parts), np.concatenate(y_parts)
+
+
+def load_csv(path=CSV_FILE):
+    labels, rows = [], []
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            if row:
+                labels.append(row[0])
+                rows.append(row[1:])
+    X = np.asarray(rows, dtype=np.float64).reshape(-1, NUM_FEATURES).astype(np.float32)
+    return X, np.asarray(labels, dtype=LABEL_DTYPE)
+
+
+# All recorded samples: the legacy CSV (if present) plus every shard
+def load_dataset(csv_path=CSV_FILE, shard_dir=SHARD_DIR):
+    X_parts, y_parts = [], []
+    if csv_path and os.path.exists(csv_path):
+        X, y = load_csv(csv_path)
+        X_parts.append(X)
+        y_parts.append(y)
+    if shard_dir and os.path.isdir(shard_dir):
+        X, y = load_shards(shard_dir)
+        X_parts.append(X)
+        y_parts.append(y)
+    if not X_parts:
+        raise FileNotFoundError(f"No data found in {csv_path} or {shard_dir}/")
+    return np.concatenate(X_parts), np.concatenate(y_parts)
+
+
+def export_csv(X, y, path):
+    with open(path, mode='w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(csv_header())
+        for label, row in zip(y, X):
+            writer.writerow([label] + row.tolist())
+
+
+# Hash of the raw bytes of every source file (CSV and shards)
+def source_hash(csv_path=CSV_FILE, shard_dir=SHARD_DIR):
+    digest = hashlib.sha1()
+    paths = []
+    if csv_path and os.path.exists(csv_path):
+        paths.append(csv_path)
+    if shard_dir and os.path.isdir(shard_dir):
+        paths.extend(list_shards(shard_dir))
+    if not paths:
+        raise FileNotFoundError(f"No data found in {csv_path} or {shard_dir}/")
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+# Paths of the cached X / y arrays for a given source hash
+def cache_paths(key, cache_dir=CACHE_DIR):
+    return (os.path.join(cache_dir, f'dataset_{key}_X.npy'),
+            os.path.join(cache_dir, f'dataset_{key}_y.npy'))
+
+
+# Parsed dataset as memory-mapped arrays, cached in `cache_dir` and keyed
+# by the hash of the source files; only re-parsed when the data changes.
+# Returns (X, y, key).
+def load_dataset_cached(csv_path=CSV_FILE, shard_dir=SHARD_DIR, cache_dir=CACHE_DIR):
+    key = source_hash(csv_path, shard_dir)
+    x_path, y_path = cache_paths(key, cache_dir)
+    if not (os.path.exists(x_path) and os.path.exists(y_path)):
+        X, y = load_dataset(csv_path, shard_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        for path, array in ((x_path, X), (y_path, y)):
+            tmp = path + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp, path)
+    return np.load(x_path, mmap_mode='r'), np.load(y_path, mmap_mode='r'), key
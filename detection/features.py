@@ -0,0 +1,45 @@
+import numpy as np
+
+# MediaPipe returns 21 landmarks per hand; we use (x, y) of each one
+NUM_LANDMARKS = 21
+NUM_FEATURES = NUM_LANDMARKS * 2
+
+
+# Copy the (x, y) of every landmark into a (21, 2) array
+def landmarks_to_array(hand_landmarks, out=None):
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, 2), dtype=np.float32)
+    out.reshape(-1)[:] = np.fromiter(
+        (c for lm in hand_landmarks.landmark for c in (lm.x, lm.y)),
+        dtype=out.dtype,
+        count=NUM_FEATURES,
+    )
+    return out
+
+
+# Wrist-relative coordinates: subtract landmark 0 (the wrist) from all
+# points so the features are position-invariant. Writes a (1, 42) row.
+def extract_features(points, out=None):
+    if out is None:
+        out = np.empty((1, NUM_FEATURES), dtype=np.float32)
+    np.subtract(points, points[0], out=out.reshape(NUM_LANDMARKS, 2))
+    return out
+
+
+# Reusable extractor with preallocated buffers, one call per frame.
+# The returned row is overwritten on the next call; copy it to keep it.
+class FeatureExtractor:
+    def __init__(self, dtype=np.float32):
+        self.points = np.empty((NUM_LANDMARKS, 2), dtype=dtype)
+        self.features = np.empty((1, NUM_FEATURES), dtype=dtype)
+
+    def __call__(self, hand_landmarks):
+        landmarks_to_array(hand_landmarks, out=self.points)
+        return extract_features(self.points, out=self.features)
+
+
+# Label and confidence from a single predict_proba call
+def predict_with_confidence(model, features):
+    proba = model.predict_proba(features)[0]
+    best = int(np.argmax(proba))
+    return model.classes_[best], float(proba[best])
@@ -0,0 +1,129 @@
+import json
+import os
+
+import numpy as np
+
+# Flat tree-ensemble engine.
+#
+# A trained RandomForestClassifier is exported as contiguous NumPy arrays
+# (one .npy file each, so they can be memory-mapped) plus a small JSON
+# header. All trees are stored back to back; leaves point to themselves so
+# every sample can walk every tree in lock-step for `max_depth` steps.
+# Loading and predicting only needs NumPy, not scikit-learn.
+
+FORMAT_VERSION = 1
+ARRAYS = ("feature", "threshold", "left", "right", "leaf_index", "leaf_values", "roots")
+
+
+# Flatten a fitted sklearn forest into `path` (a directory)
+def export_forest(model, path):
+    features, thresholds, lefts, rights, leaf_index, leaf_values, roots = [], [], [], [], [], [], []
+    offset = 0
+    leaf_offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        node_ids = np.arange(offset, offset + n, dtype=np.int32)
+        is_leaf = tree.children_left == -1
+
+        left = np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32)
+        right = np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32)
+        feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+
+        # Per-tree class distributions at the leaves, normalized like
+        # sklearn does before averaging the trees
+        values = tree.value[is_leaf, 0, :].astype(np.float64)
+        values /= values.sum(axis=1, keepdims=True)
+        index = np.full(n, -1, dtype=np.int32)
+        index[is_leaf] = np.arange(leaf_offset, leaf_offset + values.shape[0], dtype=np.int32)
+
+        features.append(feature)
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(left)
+        rights.append(right)
+        leaf_index.append(index)
+        leaf_values.append(values.astype(np.float32))
+        roots.append(offset)
+        offset += n
+        leaf_offset += values.shape[0]
+        max_depth = max(max_depth, tree.max_depth)
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "leaf_index": np.concatenate(leaf_index),
+        "leaf_values": np.concatenate(leaf_values),
+        "roots": np.asarray(roots, dtype=np.int32),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "classes": [c.item() if hasattr(c, "item") else c for c in model.classes_],
+        "n_features": int(model.n_features_in_),
+        "n_trees": len(roots),
+        "max_depth": int(max_depth),
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+# Vectorized inference over the exported arrays. Exposes `classes_`,
+# `predict` and `predict_proba` like the sklearn model it replaces.
+class FlatForest:
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes_ = np.asarray(meta["classes"])
+        self.n_features = meta["n_features"]
+        self.max_depth = meta["max_depth"]
+        self.is_leaf = self.leaf_index >= 0
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported flat forest version: {meta.get('version')}")
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS
+        }
+        return cls(arrays, meta)
+
+    # Leaf reached in every tree for every sample, shape (n_samples, n_trees)
+    def apply(self, X):
+        # sklearn casts inputs to float32 and compares against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.n_features)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.repeat(self.roots[None, :], X.shape[0], axis=0)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            if self.is_leaf[nodes].all():
+                break
+        return nodes
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        return self.leaf_values[self.leaf_index[leaves]].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+# Classifier used at runtime: the flat model when it exists, otherwise the
+# pickled sklearn model (which does import sklearn)
+def load_model(flat_dir='model_flat', pickle_path='model.p'):
+    if os.path.exists(os.path.join(flat_dir, 'meta.json')):
+        return FlatForest.load(flat_dir)
+    import pickle
+
+    with open(pickle_path, 'rb') as f:
+        return pickle.load(f)
@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Persistent outbound message queue.
+#
+# `put` appends the message to an on-disk log (one JSON line each) and
+# returns right away; a background thread sends the messages in order
+# through `send(topic, payload) -> bool`. The byte offset of the first
+# unsent message is kept in a separate file, so whatever was not sent
+# survives a crash or restart and goes out on the next run.
+#
+# Delivery is at-least-once: a message whose send timed out is sent again,
+# even though the receiver may already have it. Give each payload its own
+# id so the receiver can drop the repeated copy.
+
+OUTBOX_DIR = 'outbox'
+LOG_FILE = 'log.jsonl'
+OFFSET_FILE = 'offset'
+
+
+class Outbox:
+    def __init__(self, send, directory=OUTBOX_DIR, cooldown=0.0, retry_base=0.5,
+                 retry_max=30.0, compact_bytes=64 * 1024):
+        # cooldown: minimum seconds between two sends (rate limit)
+        # retry_base / retry_max: exponential backoff after a failed send
+        # compact_bytes: truncate the log once everything in it was sent
+        self.send = send
+        self.cooldown = cooldown
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.compact_bytes = compact_bytes
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.offset_path = os.path.join(directory, OFFSET_FILE)
+        os.makedirs(directory, exist_ok=True)
+
+        self.sent = 0
+        self.failures = 0
+        self.last_send_ms = 0.0   # Duration of the last successful send
+        self.last_wait_s = 0.0    # Time from put() to delivery of the last message
+        self._send_ms_total = 0.0
+
+        self._cond = threading.Condition()
+        self._closed = False
+        self._pending = deque()   # (end offset, record)
+        self._offset = self._read_offset()
+        self._end = self._load()
+        self._log = open(self.log_path, 'ab')
+        self._thread = threading.Thread(target=self._run, name='outbox', daemon=True)
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_offset(self):
+        tmp = self.offset_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(self._offset))
+        os.replace(tmp, self.offset_path)
+
+    # Unsent records from a previous run; returns the end of the log
+    def _load(self):
+        if not os.path.exists(self.log_path):
+            return 0
+        size = os.path.getsize(self.log_path)
+        if self._offset > size:
+            # The log was compacted but the offset was not updated yet
+            self._offset = 0
+        position = self._offset
+        with open(self.log_path, 'rb') as f:
+            f.seek(position)
+            for line in f:
+                position += len(line)
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    self._pending.append((position, json.loads(line)))
+                except ValueError:
+                    continue  # Half-written line from a crash
+        if size:
+            with open(self.log_path, 'rb+') as f:
+                f.seek(size - 1)
+                if f.read(1) != b'\n':
+                    # Terminate a torn last line so new records start clean
+                    f.write(b'\n')
+                    size += 1
+        return size
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    # Never blocks on the network: only a buffered append to the log
+    def put(self, topic, payload):
+        record = {'topic': topic, 'payload': payload, 't': time.time()}
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._cond:
+            self._log.write(line)
+            self._log.flush()
+            self._end += len(line)
+            self._pending.append((self._end, record))
+            self._cond.notify()
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    @property
+    def mean_send_ms(self):
+        return self._send_ms_total / self.sent if self.sent else 0.0
+
+    def stats(self):
+        return {
+            'depth': self.depth,
+            'sent': self.sent,
+            'failures': self.failures,
+            'last_send_ms': self.last_send_ms,
+            'mean_send_ms': self.mean_send_ms,
+            'last_wait_s': self.last_wait_s,
+        }
+
+    # Stop the sender; unsent messages stay in the log for the next run
+    def close(self, timeout=1.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        self._log.close()
+
+    # Wait `seconds` (put() notifications don't cut it short) unless
+    # closed; returns False when closed
+    def _sleep(self, seconds):
+        deadline = time.monotonic() + seconds
+        with self._cond:
+            while not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return not self._closed
+
+    def _run(self):
+        last_sent = float('-inf')
+        delay = 0.0
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                end, record = self._pending[0]
+
+            if not self._sleep(last_sent + self.cooldown - time.monotonic()):
+                return
+
+            start = time.monotonic()
+            try:
+                ok = self.send(record['topic'], record['payload'])
+            except Exception as e:
+                print(f"Outbox send error: {e}")
+                ok = False
+            if not ok:
+                self.failures += 1
+                delay = min(self.retry_max, delay * 2 if delay else self.retry_base)
+                if not self._sleep(delay):
+                    return
+                continue
+
+            delay = 0.0
+            last_sent = time.monotonic()
+            self.sent += 1
+            self.last_send_ms = (last_sent - start) * 1000
+            self._send_ms_total += self.last_send_ms
+            self.last_wait_s = time.time() - record['t']
+            self._advance(end)
+
+    def _advance(self, end):
+        with self._cond:
+            self._pending.popleft()
+            self._offset = end
+            if not self._pending and self._offset >= self.compact_bytes:
+                # Everything was sent: start the log over
+                self._log.truncate(0)
+                self._offset = self._end = 0
+        # Only this thread writes the offset, so put() never waits on it
+        self._write_offset()
@@ -0,0 +1,147 @@
+import threading
+import time
+
+
+# Contador de una etapa: cuadros por segundo (ventana deslizante)
+# y tiempo de la última ejecución
+class StageStats:
+    def __init__(self, name, window=1.0):
+        self.name = name
+        self.window = window
+        self.count = 0
+        self.last_ms = 0.0
+        self.fps = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+    def tick(self, elapsed=None):
+        now = time.monotonic()
+        with self._lock:
+            self.count += 1
+            self._window_count += 1
+            if elapsed is not None:
+                self.last_ms = elapsed * 1000.0
+            span = now - self._window_start
+            if span >= self.window:
+                self.fps = self._window_count / span
+                self._window_start = now
+                self._window_count = 0
+
+
+# Casilla de un solo elemento donde gana el más reciente: escribir nunca
+# bloquea y el lector siempre obtiene lo último que se publicó
+class LatestSlot:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._taken = 0
+        self._closed = False
+        # Elementos reemplazados antes de que alguien los leyera
+        self.overwritten = 0
+
+    # Elementos publicados que todavía no se leyeron (0 o 1)
+    @property
+    def depth(self):
+        with self._cond:
+            return 1 if self._seq > self._taken else 0
+
+    def put(self, item):
+        with self._cond:
+            if self._seq > self._taken:
+                self.overwritten += 1
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    # Espera un elemento más nuevo que `after`; devuelve (seq, elemento)
+    def get(self, after=0, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after or self._closed, timeout=timeout)
+            if self._seq <= after:
+                return after, None
+            self._taken = self._seq
+            return self._seq, self._item
+
+    # Lectura sin espera del último elemento (para la interfaz)
+    def peek(self):
+        with self._cond:
+            return self._seq, self._item
+
+    @property
+    def closed(self):
+        with self._cond:
+            return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+# Hilo de captura: lee la cámara y publica siempre el último cuadro
+class CaptureThread(threading.Thread):
+    def __init__(self, cap, slot, transform=None):
+        super().__init__(name="captura", daemon=True)
+        self.cap = cap
+        self.slot = slot
+        self.transform = transform
+        self.stats = StageStats("captura")
+        self.running = True
+
+    def run(self):
+        while self.running:
+            start = time.monotonic()
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            if self.transform is not None:
+                frame = self.transform(frame)
+            self.slot.put((time.monotonic(), frame))
+            self.stats.tick(time.monotonic() - start)
+        self.running = False
+        self.slot.close()
+
+    def stop(self):
+        self.running = False
+
+
+# Hilo de inferencia: siempre procesa el cuadro más reciente de la captura
+# y publica el resultado en su propia casilla
+class InferenceThread(threading.Thread):
+    def __init__(self, frames, results, infer, target_fps=None):
+        super().__init__(name="inferencia", daemon=True)
+        self.frames = frames
+        self.results = results
+        self.infer = infer
+        # Límite de cuadros por segundo, para compartir la CPU con otros procesos
+        self.min_interval = 1.0 / target_fps if target_fps else 0.0
+        self.stats = StageStats("inferencia")
+        self.running = True
+
+    def run(self):
+        seq = 0
+        while self.running:
+            new_seq, item = self.frames.get(after=seq, timeout=0.5)
+            if item is None:
+                if self.frames.closed:
+                    break
+                continue
+            seq = new_seq
+            captured_at, frame = item
+            start = time.monotonic()
+            try:
+                result = self.infer(frame)
+            except Exception as e:
+                print(f"Error en predicción: {e}")
+                result = None
+            self.results.put((captured_at, result))
+            self.stats.tick(time.monotonic() - start)
+            wait = self.min_interval - (time.monotonic() - start)
+            if wait > 0:
+                time.sleep(wait)
+        self.results.close()
+
+    def stop(self):
+        self.running = False
@@ -1,11 +1,18 @@
 import cv2
 import mediapipe as mp
-import pickle
 import numpy as np
 import paho.mqtt.client as mqtt
 import ssl
 import json
 import time
+import uuid
+
+from features import NUM_FEATURES, extract_features, predict_with_confidence
+from forest_engine import FlatForest, load_model
+from outbox import Outbox
+from pipeline import CaptureThread, InferenceThread, LatestSlot, StageStats
+from roi_tracker import HandTracker
+from smoothing import AutoCommitter
 
 # ==========================================
 # ☁️ CONFIGURACIÓN AWS IOT
@@ -43,121 +50,269 @@ mqtt_client.tls_set(
 
 # Conectar en segundo plano (Non-blocking)
 print("🔄 Conectando a la nube...")
-mqtt_client.connect(IOT_ENDPOINT, PORT)
+mqtt_client.connect_async(IOT_ENDPOINT, PORT)
 mqtt_client.loop_start() 
 
+# Segundos que se espera la confirmación (PUBACK) de IoT Core
+TIEMPO_CONFIRMACION = 5.0
+
+# Envío real de un mensaje (lo llama el hilo de la cola de salida, nunca
+# el bucle de video). Devuelve False si no hay conexión o no se confirmó.
+def publicar(topic, payload):
+    # Sin conexión no se publica: paho guardaría el mensaje y lo mandaría
+    # al reconectar, duplicándolo con el reintento de la cola
+    if not mqtt_client.is_connected():
+        return False
+    # Hora real de envío (el mensaje pudo esperar en la cola)
+    payload["t_envio"] = time.time()
+    info = mqtt_client.publish(topic, json.dumps(payload), qos=1)
+    if info.rc != mqtt.MQTT_ERR_SUCCESS:
+        return False
+    limite = time.monotonic() + TIEMPO_CONFIRMACION
+    while not info.is_published():
+        if time.monotonic() > limite:
+            return False
+        time.sleep(0.05)
+    return True
+
 # ==========================================
 # 📷 CONFIGURACIÓN VISIÓN ARTIFICIAL
 # ==========================================
+# Se prefiere el modelo plano (NumPy, sin sklearn); si no existe, model.p
+MODELO_PLANO = 'model_flat'
+
 try:
-    with open('model.p', 'rb') as f:
-        model = pickle.load(f)
+    model = load_model(MODELO_PLANO, 'model.p')
 except FileNotFoundError:
     print("❌ Error: model.p no encontrado. ¡Entrena el modelo primero!")
     exit()
+if isinstance(model, FlatForest):
+    print(f"🌲 Modelo plano cargado desde {MODELO_PLANO}/")
 
 mp_hands = mp.solutions.hands
-mp_drawing = mp.solutions.drawing_utils
 hands = mp_hands.Hands(static_image_mode=False, max_num_hands=1, min_detection_confidence=0.7)
+# Para los recortes alrededor de la mano. También en modo video: el recorte
+# sigue a la mano, así que MediaPipe la sigue rastreando dentro de él y no
+# vuelve a buscar la palma en cada cuadro
+hands_roi = mp_hands.Hands(static_image_mode=False, max_num_hands=1, min_detection_confidence=0.7)
 
 cap = cv2.VideoCapture(0)
 
+# Modo adaptativo: recorta a la mano y se salta detecciones si no se mueve
+MODO_ADAPTATIVO = True
+UMBRAL_MOVIMIENTO = 0.01  # Desplazamiento medio de los puntos (fracción del cuadro)
+MAX_CUADROS_SALTADOS = 2  # Cuadros seguidos que se pueden reutilizar
+FPS_OBJETIVO = 15         # Máximo de inferencias por segundo (None = sin límite)
+
+tracker = HandTracker(hands, hands_roi, motion_threshold=UMBRAL_MOVIMIENTO,
+                      max_skip=MAX_CUADROS_SALTADOS if MODO_ADAPTATIVO else 0)
+
+# Buffer preasignado para las características
+data_aux = np.empty((1, NUM_FEATURES), dtype=np.float32)
+
 # Variables para controlar el flujo de notificaciones (Debounce)
-ultimo_envio_tiempo = 0
 COOLDOWN_SEGUNDOS = 8  # Alexa solo hablará cada 8 segundos máximo
 
+# Cola de salida en disco: las frases se guardan en outbox/ y un hilo las
+# envía respetando el cooldown y reintentando si no hay conexión; lo que
+# no se envió se manda al volver a abrir el programa
+outbox = Outbox(publicar, directory='outbox', cooldown=COOLDOWN_SEGUNDOS).start()
+if outbox.depth:
+    print(f"📨 {outbox.depth} frases pendientes de la sesión anterior")
+
 # Variables para el control de la frase
 frase_actual = ""
 ultimo_agregado_tiempo = 0
 COOLDOWN_TECLA = 0.5  # Tiempo mínimo entre agregar letras (para evitar rebotes)
 
+# Auto-agregado: la letra se agrega sola si se mantiene estable
+AUTO_AGREGAR = True
+VENTANA_VOTOS = 15       # Últimas predicciones que votan
+TIEMPO_ESTABLE = 0.6     # Segundos que la letra debe liderar para agregarse
+TIEMPO_LIBERAR = 0.4     # Segundos sin esa letra para poder repetirla
+auto = AutoCommitter(window=VENTANA_VOTOS, min_confidence=0.85,
+                     dwell=TIEMPO_ESTABLE, release=TIEMPO_LIBERAR)
+
+# Mostrar FPS y profundidad de las colas de cada etapa
+MOSTRAR_ESTADISTICAS = True
+
+
+# Resultado de la inferencia sobre un cuadro
+class Deteccion:
+    def __init__(self, puntos, letra, confianza):
+        self.puntos = puntos
+        self.letra = letra
+        self.confianza = confianza
+
+
+# ==========================================
+# 🧠 ETAPA DE INFERENCIA (hilo propio)
+# ==========================================
+ultima_deteccion = None
+
+
+def inferir(frame):
+    global ultima_deteccion
+    if MODO_ADAPTATIVO:
+        puntos, nuevos = tracker.process(frame)
+    else:
+        puntos, nuevos = HandTracker.detect(hands, frame), True
+    if puntos is None:
+        ultima_deteccion = None
+        return None
+    if not nuevos and ultima_deteccion is not None:
+        # La mano no se movió: se reutiliza la última clasificación
+        return ultima_deteccion
+
+    # Preprocesamiento de datos (Normalización respecto a la muñeca)
+    extract_features(puntos, out=data_aux)
+
+    # Predicción y confianza con una sola pasada del modelo
+    letra, confianza = predict_with_confidence(model, data_aux)
+    ultima_deteccion = Deteccion(puntos, letra, confianza)
+    return ultima_deteccion
+
+
+# Dibuja los puntos de la mano (coordenadas normalizadas) sobre el cuadro
+def dibujar_mano(frame, puntos):
+    alto, ancho = frame.shape[:2]
+    pixeles = [(int(x * ancho), int(y * alto)) for x, y in puntos]
+    for a, b in mp_hands.HAND_CONNECTIONS:
+        cv2.line(frame, pixeles[a], pixeles[b], (255, 255, 255), 2)
+    for p in pixeles:
+        cv2.circle(frame, p, 3, (0, 0, 255), -1)
+
+
+# ==========================================
+# 🧵 PIPELINE: captura -> inferencia -> interfaz
+# ==========================================
+# La captura y la inferencia corren en hilos propios; la inferencia
+# siempre toma el cuadro más reciente y la interfaz nunca la espera.
+cuadros = LatestSlot()
+resultados = LatestSlot()
+captura = CaptureThread(cap, cuadros, transform=lambda f: cv2.flip(f, 1))  # 1 = espejo horizontal
+inferencia = InferenceThread(cuadros, resultados, inferir, target_fps=FPS_OBJETIVO)
+interfaz = StageStats("interfaz")
+captura.start()
+inferencia.start()
+
 print("📷 Cámara iniciada.")
 print("   [ESPACIO] -> Agregar letra detectada")
+print("   [A]       -> Activar/desactivar auto-agregado")
 print("   [ENTER]   -> Enviar frase a Alexa")
 print("   [BORRAR]  -> Eliminar última letra")
 print("   [Q]       -> Salir")
 
+ultimo_cuadro = 0
+ultimo_resultado = 0
 while True:
-    ret, frame = cap.read()
-    if not ret: break
-
-    # Espejo y conversión de color
-    frame = cv2.flip(frame, 1) # Usualmente 1 es espejo horizontal
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = hands.process(rgb_frame)
-    
-    if results.multi_hand_landmarks:
-        for hand_landmarks in results.multi_hand_landmarks:
-            mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-            
-            # Preprocesamiento de datos (Normalización)
-            base_x = hand_landmarks.landmark[0].x
-            base_y = hand_landmarks.landmark[0].y
-            
-            data_aux = []
-            for lm in hand_landmarks.landmark:
-                data_aux.extend([lm.x - base_x, lm.y - base_y])
-            
-            # Predicción
-            try:
-                prediction = model.predict([data_aux])
-                predicted_character = prediction[0]
-                
-                # Confianza
-                proba = model.predict_proba([data_aux])
-                confidence = np.max(proba)
-                
-                # ==========================================
-                # 📝 INTERFAZ VISUAL ACTUALIZADA
-                # ==========================================
-                
-                # Dibujar rectángulo de fondo para la letra actual
-                cv2.rectangle(frame, (0, 0), (300, 60), (0,0,0), -1)
-                
-                # Mostrar letra detectada en tiempo real (solo visual)
-                color_texto = (255, 255, 255)
-                if confidence > 0.85:
-                    color_texto = (0, 255, 0) # Verde si es confiable
-                    
-                cv2.putText(frame, f"Detectado: {predicted_character} ({int(confidence*100)}%)", 
-                           (10, 40), cv2.FONT_HERSHEY_DUPLEX, 0.8, color_texto, 1)
-
-                # Mostrar la FRASE que estás construyendo en la parte inferior
-                cv2.rectangle(frame, (0, 400), (640, 480), (50, 50, 50), -1)
-                cv2.putText(frame, f"Frase: {frase_actual}", 
-                           (10, 450), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-
-            except Exception as e:
-                print(f"Error en predicción: {e}") 
+    seq, item = cuadros.peek()
+    nuevo = item is not None and seq != ultimo_cuadro
+    if not nuevo and not captura.is_alive():
+        break
+    inicio = time.monotonic()
+
+    seq_resultado, resultado = resultados.peek()
+    deteccion = resultado[1] if resultado else None
+
+    # Cada resultado nuevo de la inferencia es un voto
+    if AUTO_AGREGAR and seq_resultado != ultimo_resultado:
+        ultimo_resultado = seq_resultado
+        letra = auto.update(deteccion.letra if deteccion else None,
+                            deteccion.confianza if deteccion else 0.0, resultado[0])
+        if letra is not None:
+            frase_actual += letra
+            ultimo_agregado_tiempo = time.time()
+            print(f"✨ Letra auto-agregada: {letra} | Frase: {frase_actual}")
+
+    # Solo se redibuja cuando hay un cuadro nuevo
+    if nuevo:
+        ultimo_cuadro = seq
+        # Copia para dibujar sin tocar el cuadro que usa la inferencia
+        frame = item[1].copy()
+
+        if deteccion is not None:
+            dibujar_mano(frame, deteccion.puntos)
+            predicted_character = deteccion.letra
+            confidence = deteccion.confianza
+
+            # ==========================================
+            # 📝 INTERFAZ VISUAL ACTUALIZADA
+            # ==========================================
+
+            # Dibujar rectángulo de fondo para la letra actual
+            cv2.rectangle(frame, (0, 0), (300, 60), (0,0,0), -1)
+
+            # Mostrar letra detectada en tiempo real (solo visual)
+            color_texto = (255, 255, 255)
+            if confidence > 0.85:
+                color_texto = (0, 255, 0) # Verde si es confiable
+
+            cv2.putText(frame, f"Detectado: {predicted_character} ({int(confidence*100)}%)",
+                       (10, 40), cv2.FONT_HERSHEY_DUPLEX, 0.8, color_texto, 1)
+
+            # Barra de progreso hacia el auto-agregado
+            if AUTO_AGREGAR:
+                progreso = auto.progress(resultado[0])
+                cv2.rectangle(frame, (10, 50), (10 + int(280 * progreso), 56), (0, 255, 0), -1)
+
+        # Mostrar la FRASE que estás construyendo en la parte inferior
+        cv2.rectangle(frame, (0, 400), (640, 480), (50, 50, 50), -1)
+        cv2.putText(frame, f"Frase: {frase_actual}",
+                   (10, 450), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+        if MOSTRAR_ESTADISTICAS:
+            lineas = [
+                f"cap {captura.stats.fps:.0f} fps | inf {inferencia.stats.fps:.0f} fps "
+                f"({inferencia.stats.last_ms:.0f} ms) | ui {interfaz.fps:.0f} fps",
+                f"cola {cuadros.depth}/{resultados.depth} | perdidos {cuadros.overwritten} | "
+                f"mp completo {tracker.full_runs} recorte {tracker.roi_runs} saltos {tracker.skips}",
+                f"mqtt pendientes {outbox.depth} | enviados {outbox.sent} fallos {outbox.failures} | "
+                f"envio {outbox.last_send_ms:.0f} ms (prom {outbox.mean_send_ms:.0f} ms)",
+            ]
+            for i, linea in enumerate(lineas):
+                cv2.putText(frame, linea, (10, 80 + 18 * i), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.45, (0, 255, 255), 1)
+
+        cv2.imshow('Sign Language Detector', frame)
+        interfaz.tick(time.monotonic() - inicio)
+
     # ==========================================
     # ⌨️ CONTROL DE TECLADO (ESPACIO / ENTER)
     # ==========================================
-    # Capturamos la tecla una sola vez por frame
+    # Se lee la tecla en cada vuelta, haya o no cuadro nuevo: el bucle
+    # gira más rápido que la cámara y de lo contrario se perderían teclas
     key = cv2.waitKey(1) & 0xFF
 
     # [ESPACIO]: Agregar letra a la frase
-    if key == 32: 
+    if key == 32:
         tiempo_actual = time.time()
-        # Solo agregar si: 
-        # 1. Hay detección activa (predicted_character existe)
+        # Solo agregar si:
+        # 1. Hay detección activa
         # 2. La confianza es buena
         # 3. Pasó el tiempo de cooldown para evitar duplicados rápidos
-        if 'predicted_character' in locals() and confidence > 0.85:
+        if deteccion is not None and deteccion.confianza > 0.85:
             if (tiempo_actual - ultimo_agregado_tiempo) > COOLDOWN_TECLA:
-                frase_actual += predicted_character
+                frase_actual += deteccion.letra
                 ultimo_agregado_tiempo = tiempo_actual
-                print(f"➕ Letra agregada: {predicted_character} | Frase: {frase_actual}")
+                print(f"➕ Letra agregada: {deteccion.letra} | Frase: {frase_actual}")
 
     # [ENTER]: Enviar frase completa a MQTT (Código 13)
-    elif key == 13: 
+    elif key == 13:
         if len(frase_actual) > 0:
             payload = {
                 "palabra": frase_actual, # Ahora enviamos la frase completa
                 "confianza": 1.0,        # Confianza manual del usuario
-                "modo": "frase_completa"
+                "modo": "frase_completa",
+                # Id estable del mensaje: si se reenvía porque no llegó el
+                # PUBACK, la Lambda descarta la copia repetida
+                "id": uuid.uuid4().hex[:12],
+                # Id de correlación para medir la latencia hasta la Lambda
+                # que avisa a Alexa (t_envio se agrega al enviarlo)
+                "cid": uuid.uuid4().hex[:16]
             }
-            mqtt_client.publish(TOPIC_PUB, json.dumps(payload), qos=1)
-            print(f"📤 FRASE ENVIADA: {frase_actual}")
+            outbox.put(TOPIC_PUB, payload)
+            print(f"📤 FRASE EN COLA: {frase_actual} (cid {payload['cid']}, {outbox.depth} pendientes)")
             frase_actual = "" # Limpiar buffer
         else:
             print("⚠️ Buffer vacío, nada que enviar.")
@@ -167,14 +322,23 @@ while True:
         frase_actual = frase_actual[:-1]
         print(f"🔙 Borrado. Nueva frase: {frase_actual}")
 
+    # [A]: Activar/desactivar auto-agregado
+    elif key == ord('a'):
+        AUTO_AGREGAR = not AUTO_AGREGAR
+        auto.reset()
+        print(f"✨ Auto-agregado {'activado' if AUTO_AGREGAR else 'desactivado'}")
+
     # [Q]: Salir
     elif key == ord('q'):
         break
 
-    cv2.imshow('Sign Language Detector', frame)
-
+captura.stop()
+inferencia.stop()
+captura.join(timeout=1)
+inferencia.join(timeout=1)
 cap.release()
 cv2.destroyAllWindows()
 
+outbox.close()
 mqtt_client.loop_stop()
 mqtt_client.disconnect()
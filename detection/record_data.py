@@ -1,24 +1,48 @@
 import cv2
 import mediapipe as mp
+import argparse
 import csv
 import os
+import numpy as np
+
+from features import FeatureExtractor
+from dataset import CSV_FILE, SHARD_DIR, SampleBuffer, csv_header, export_csv, load_dataset
 
 # --- CONFIGURATION ---
-FILE_NAME = 'hand_data.csv'
+parser = argparse.ArgumentParser(description="Record hand sign samples")
+parser.add_argument('--csv', action='store_true',
+                    help=f"Append every sample straight to {CSV_FILE} (legacy mode)")
+parser.add_argument('--burst', type=int, default=1,
+                    help="Frames captured per keypress (e.g. 25)")
+parser.add_argument('--flush-every', type=int, default=512,
+                    help="Samples kept in memory before writing a shard")
+parser.add_argument('--export-csv', metavar='PATH',
+                    help="Export all recorded samples (CSV + shards) to PATH and exit")
+args = parser.parse_args()
+
+if args.export_csv:
+    X, y = load_dataset(CSV_FILE, SHARD_DIR)
+    export_csv(X, y, args.export_csv)
+    print(f"Exported {len(y)} samples to {args.export_csv}")
+    raise SystemExit
 
 mp_hands = mp.solutions.hands
 mp_drawing = mp.solutions.drawing_utils
 hands = mp_hands.Hands(static_image_mode=False, max_num_hands=1, min_detection_confidence=0.5)
 
-# Initialize CSV if it doesn't exist
-if not os.path.exists(FILE_NAME):
-    with open(FILE_NAME, mode='w', newline='') as f:
-        writer = csv.writer(f)
-        # Header: label, then 42 coordinates (21 points * x,y)
-        header = ['label']
-        for i in range(21):
-            header.extend([f'x{i}', f'y{i}'])
-        writer.writerow(header)
+if args.csv:
+    # Initialize CSV if it doesn't exist
+    if not os.path.exists(CSV_FILE):
+        with open(CSV_FILE, mode='w', newline='') as f:
+            csv.writer(f).writerow(csv_header())
+    csv_file = open(CSV_FILE, mode='a', newline='')
+    csv_writer = csv.writer(csv_file)
+    # Keep full precision in the CSV
+    extract_features = FeatureExtractor(dtype=np.float64)
+else:
+    # Samples stay in a preallocated buffer and are written in batches
+    buffer = SampleBuffer(SHARD_DIR, capacity=args.flush_every)
+    extract_features = FeatureExtractor()
 
 cap = cv2.VideoCapture(0)
 
@@ -26,49 +50,62 @@ print("--- INSTRUCTIONS ---")
 print("1. Make a sign with your hand.")
 print("2. Press the LETTER key (a-z) on your keyboard to save that sign.")
 print("   Example: Hold 'Peace' sign -> Press 'v'.")
+if args.burst > 1:
+    print(f"   Each keypress saves the next {args.burst} frames with a hand.")
 print("3. Collect ~50 samples per letter.")
-print("4. Press 'q' to quit.")
-
-while True:
-    ret, frame = cap.read()
-    if not ret: break
-    
-    # FIX: Rotate camera
-    # frame = cv2.flip(frame, -1)
-    
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = hands.process(rgb_frame)
-    
-    if results.multi_hand_landmarks:
-        for hand_landmarks in results.multi_hand_landmarks:
-            mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-            
-            # Extract relative coordinates
-            # We subtract the WRIST (landmark 0) from all points to make it 
-            # position-invariant (so it works even if your hand is in the corner)
-            base_x = hand_landmarks.landmark[0].x
-            base_y = hand_landmarks.landmark[0].y
-            
-            row = []
-            for lm in hand_landmarks.landmark:
-                row.extend([lm.x - base_x, lm.y - base_y])
-            
-            # Check for key presses to save data
-            key = cv2.waitKey(1)
-            if key != -1 and key != 27:
-                label = chr(key).upper() # Convert 'a' to 'A'
-                
-                # Write to CSV
-                with open(FILE_NAME, mode='a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([label] + row)
-                
-                cv2.putText(frame, f"Saved: {label}", (10, 50), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-    
-    cv2.imshow('Data Recorder', frame)
-    if cv2.waitKey(1) & 0xFF == 27:
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+print("4. Press ESC to quit.")
+
+label = None
+remaining = 0
+saved = 0
+
+try:
+    while True:
+        ret, frame = cap.read()
+        if not ret: break
+
+        # FIX: Rotate camera
+        # frame = cv2.flip(frame, -1)
+
+        # Check for key presses once per frame
+        key = cv2.waitKey(1)
+        if key != -1 and (key & 0xFF) == 27:
+            break
+        if key != -1:
+            label = chr(key & 0xFF).upper() # Convert 'a' to 'A'
+            remaining = args.burst
+
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = hands.process(rgb_frame)
+
+        if results.multi_hand_landmarks:
+            for hand_landmarks in results.multi_hand_landmarks:
+                mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+
+                # Extract relative coordinates
+                # We subtract the WRIST (landmark 0) from all points to make it
+                # position-invariant (so it works even if your hand is in the corner)
+                row = extract_features(hand_landmarks)
+
+                if remaining > 0:
+                    if args.csv:
+                        csv_writer.writerow([label] + row[0].tolist())
+                    else:
+                        buffer.append(label, row)
+                    remaining -= 1
+                    saved += 1
+
+                    cv2.putText(frame, f"Saved: {label} ({saved})", (10, 50),
+                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+        cv2.imshow('Data Recorder', frame)
+finally:
+    cap.release()
+    cv2.destroyAllWindows()
+
+    # Flush whatever is still in memory, even on Ctrl+C
+    if args.csv:
+        csv_file.close()
+    else:
+        buffer.flush()
+        print(f"Saved {buffer.flushed} samples to {SHARD_DIR}/")
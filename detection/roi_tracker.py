@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+from features import landmarks_to_array
+
+
+# Rectángulo (en píxeles) que contiene los puntos, con un margen relativo
+def bounding_box(points, width, height, margin=0.3, min_size=96):
+    x_min, y_min = points.min(axis=0)
+    x_max, y_max = points.max(axis=0)
+    cx, cy = (x_min + x_max) / 2 * width, (y_min + y_max) / 2 * height
+    side = max((x_max - x_min) * width, (y_max - y_min) * height) * (1 + 2 * margin)
+    side = max(side, min_size)
+    x0 = int(max(0, cx - side / 2))
+    y0 = int(max(0, cy - side / 2))
+    x1 = int(min(width, cx + side / 2))
+    y1 = int(min(height, cy + side / 2))
+    return x0, y0, x1, y1
+
+
+# Seguimiento adaptativo de la mano para ahorrar llamadas a MediaPipe:
+#   - mientras la mano casi no se mueve, se reutilizan los últimos puntos
+#     y solo se vuelve a detectar cada `max_skip + 1` cuadros;
+#   - si se conoce la posición de la mano, se procesa solo ese recorte;
+#   - si se pierde la mano en el recorte, se vuelve al cuadro completo.
+class HandTracker:
+    def __init__(self, hands_full, hands_roi, motion_threshold=0.01, max_skip=2,
+                 margin=0.3, min_roi=96):
+        self.hands_full = hands_full
+        self.hands_roi = hands_roi
+        self.motion_threshold = motion_threshold
+        self.max_skip = max_skip
+        self.margin = margin
+        self.min_roi = min_roi
+        self.points = None
+        self.motion = float("inf")
+        self.skipped = 0
+        # Contadores para ver cuánto trabajo se ahorra
+        self.full_runs = 0
+        self.roi_runs = 0
+        self.skips = 0
+        self.lost = 0
+
+    def reset(self):
+        self.points = None
+        self.motion = float("inf")
+        self.skipped = 0
+
+    # Devuelve (puntos, nuevos): puntos (21, 2) normalizados al cuadro
+    # completo o None si no hay mano; `nuevos` es False si se reutilizaron
+    def process(self, frame):
+        if self.points is not None and self.motion < self.motion_threshold \
+                and self.skipped < self.max_skip:
+            self.skipped += 1
+            self.skips += 1
+            return self.points, False
+        self.skipped = 0
+
+        height, width = frame.shape[:2]
+        points = None
+        if self.points is not None:
+            x0, y0, x1, y1 = bounding_box(self.points, width, height, self.margin, self.min_roi)
+            crop = frame[y0:y1, x0:x1]
+            self.roi_runs += 1
+            points = self.detect(self.hands_roi, crop)
+            if points is not None:
+                # Del recorte a coordenadas normalizadas del cuadro completo
+                points[:, 0] = (x0 + points[:, 0] * (x1 - x0)) / width
+                points[:, 1] = (y0 + points[:, 1] * (y1 - y0)) / height
+            else:
+                self.lost += 1
+
+        if points is None:
+            self.full_runs += 1
+            points = self.detect(self.hands_full, frame)
+
+        if points is None:
+            self.reset()
+            return None, True
+
+        if self.points is not None:
+            self.motion = float(np.abs(points - self.points).mean())
+        else:
+            self.motion = float("inf")
+        self.points = points
+        return points, True
+
+    @staticmethod
+    def detect(hands, image):
+        if image.size == 0:
+            return None
+        results = hands.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if not results.multi_hand_landmarks:
+            return None
+        return landmarks_to_array(results.multi_hand_landmarks[0])
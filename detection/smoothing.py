@@ -0,0 +1,119 @@
+import time
+
+
+# Votación sobre las últimas N predicciones. Las etiquetas se guardan en un
+# buffer circular de tamaño fijo y se lleva la cuenta de cada clase, así que
+# agregar una predicción es O(1); la clase líder solo se recalcula (sobre las
+# pocas clases existentes) cuando sale de la ventana un voto de la líder.
+class SlidingVoter:
+    def __init__(self, window=15):
+        self.window = window
+        self._ring = [None] * window
+        self._pos = 0
+        self._size = 0
+        self._counts = {}
+        self._leader = None
+        self._leader_count = 0
+
+    def __len__(self):
+        return self._size
+
+    # Agrega una predicción (None = sin mano o confianza baja)
+    def push(self, label):
+        if self._size == self.window:
+            old = self._ring[self._pos]
+            self._counts[old] -= 1
+            if self._counts[old] == 0:
+                del self._counts[old]
+            if old == self._leader:
+                self._leader, self._leader_count = max(
+                    self._counts.items(), key=lambda kv: kv[1], default=(None, 0)
+                )
+        else:
+            self._size += 1
+
+        self._ring[self._pos] = label
+        self._pos = (self._pos + 1) % self.window
+        count = self._counts.get(label, 0) + 1
+        self._counts[label] = count
+        if count > self._leader_count:
+            self._leader, self._leader_count = label, count
+
+    # Clase más votada y la fracción de la ventana que la votó
+    def leader(self):
+        if self._size == 0:
+            return None, 0.0
+        return self._leader, self._leader_count / self.window
+
+    def clear(self):
+        self._ring = [None] * self.window
+        self._pos = 0
+        self._size = 0
+        self._counts = {}
+        self._leader = None
+        self._leader_count = 0
+
+
+# Agrega letras automáticamente cuando la votación se mantiene estable.
+#   - una letra se confirma si lidera con al menos `min_share` de la
+#     ventana durante `dwell` segundos;
+#   - después de confirmarla, la misma letra no se vuelve a confirmar hasta
+#     que otra cosa (otra letra o ninguna mano) lidere por `release` segundos.
+class AutoCommitter:
+    def __init__(self, window=15, min_confidence=0.6, min_share=0.7, dwell=0.6, release=0.4):
+        self.voter = SlidingVoter(window)
+        self.min_confidence = min_confidence
+        self.min_share = min_share
+        self.dwell = dwell
+        self.release = release
+        self.candidate = None
+        self.candidate_since = 0.0
+        self.last_committed = None
+        self.released_since = None
+
+    # Progreso (0 a 1) del candidato actual hacia confirmarse
+    def progress(self, now=None):
+        if self.candidate is None or self.candidate == self.last_committed:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return min(1.0, (now - self.candidate_since) / self.dwell) if self.dwell else 1.0
+
+    # Registra una predicción; devuelve la letra confirmada o None
+    def update(self, label, confidence, now=None):
+        now = time.monotonic() if now is None else now
+        if label is not None and confidence < self.min_confidence:
+            label = None
+        self.voter.push(label)
+        leader, share = self.voter.leader()
+        if share < self.min_share:
+            leader = None
+
+        # Histéresis: la última letra confirmada se libera cuando deja de
+        # liderar durante `release` segundos
+        if self.last_committed is not None:
+            if leader == self.last_committed:
+                self.released_since = None
+            elif self.released_since is None:
+                self.released_since = now
+            elif now - self.released_since >= self.release:
+                self.last_committed = None
+                self.released_since = None
+
+        if leader != self.candidate:
+            self.candidate = leader
+            self.candidate_since = now
+            return None
+
+        if leader is None or leader == self.last_committed:
+            return None
+        if now - self.candidate_since >= self.dwell:
+            self.last_committed = leader
+            self.released_since = None
+            return leader
+        return None
+
+    def reset(self):
+        self.voter.clear()
+        self.candidate = None
+        self.last_committed = None
+        self.released_since = None
@@ -1,34 +1,197 @@
-import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
 import pickle
+import tempfile
+import time
+import numpy as np
 
-# 1. Load Data
-try:
-    data = pd.read_csv('hand_data.csv')
-except FileNotFoundError:
-    print("Error: hand_data.csv not found. Run record_data.py first!")
-    exit()
+from augment import augment
+from dataset import CACHE_DIR, cache_paths, load_dataset_cached
+from forest_engine import FlatForest, export_forest
 
-X = data.drop('label', axis=1) # Features (coordinates)
-y = data['label']              # Target (Letters)
+# --- CONFIGURATION ---
+SWEEP_TREES = [10, 25, 50, 100]
+SWEEP_DEPTHS = [8, 12, 16, None]
+ACCURACY_BUDGET = 0.01    # Accept models up to 1 point below the best accuracy
+LATENCY_SAMPLES = 200     # Single-sample predictions timed per model
+REPORT_FILE = 'training_report.json'
+RANDOM_STATE = 42
 
-# 2. Split Data (80% training, 20% testing)
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# 3. Train Model
-# RandomForest is great for this because it handles messy data well
-model = RandomForestClassifier(n_estimators=100)
-model.fit(X_train, y_train)
+def split(X, y):
+    # 80% training, 20% testing
+    return train_test_split(X, y, test_size=0.2, random_state=RANDOM_STATE)
 
-# 4. Evaluate
-y_pred = model.predict(X_test)
-accuracy = accuracy_score(y_test, y_pred)
-print(f"Model Accuracy: {accuracy * 100:.2f}%")
 
-# 5. Save Model
-with open('model.p', 'wb') as f:
-    pickle.dump(model, f)
+def fit(X_train, y_train, n_estimators, max_depth):
+    # RandomForest is great for this because it handles messy data well
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth,
+                                   random_state=RANDOM_STATE, n_jobs=1)
+    model.fit(X_train, y_train)
+    return model
 
-print("Success! Model saved to 'model.p'")
+
+# Median single-sample latency (ms) of `predict_proba`
+def single_sample_latency(predict_proba, X, n=LATENCY_SAMPLES):
+    times = []
+    for i in range(min(n, len(X))):
+        sample = X[i:i + 1]
+        start = time.perf_counter()
+        predict_proba(sample)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+# Add augmented copies to the training split only (never the test split)
+def augment_train(X_train, y_train, options):
+    if not options or options['copies'] <= 0:
+        return X_train, y_train
+    return augment(X_train, y_train, copies=options['copies'], seed=options['seed'],
+                   mirror_prob=options['mirror_prob'])
+
+
+# Train and score one configuration (runs in a worker process).
+# The dataset is read from the memory-mapped cache, not pickled over.
+# The fitted model is saved under `out_dir` (pickle and flat export) so its
+# latency can be measured later, outside the pool.
+def evaluate(key, n_estimators, max_depth, out_dir, augment_options=None):
+    x_path, y_path = cache_paths(key)
+    X = np.load(x_path, mmap_mode='r')
+    y = np.load(y_path, mmap_mode='r')
+    X_train, X_test, y_train, y_test = split(X, y)
+    X_train, y_train = augment_train(X_train, y_train, augment_options)
+
+    start = time.perf_counter()
+    model = fit(X_train, y_train, n_estimators, max_depth)
+    train_s = time.perf_counter() - start
+    accuracy = accuracy_score(y_test, model.predict(X_test))
+
+    model_dir = os.path.join(out_dir, f"{n_estimators}_{max_depth}")
+    os.makedirs(model_dir)
+    with open(os.path.join(model_dir, 'model.p'), 'wb') as f:
+        pickle.dump(model, f)
+    export_forest(model, os.path.join(model_dir, 'flat'))
+
+    return {
+        'n_estimators': n_estimators,
+        'max_depth': max_depth,
+        'accuracy': float(accuracy),
+        'train_s': train_s,
+        'nodes': int(sum(e.tree_.node_count for e in model.estimators_)),
+        'model_dir': model_dir,
+    }
+
+
+# Single-sample latency of a saved configuration. Runs in the main process
+# after the pool has shut down, one model at a time, so the numbers are not
+# distorted by other configurations training on the remaining cores.
+def measure_latency(result, X_test):
+    model_dir = result.pop('model_dir')
+    flat = FlatForest.load(os.path.join(model_dir, 'flat'), mmap=False)
+    result['latency_ms'] = single_sample_latency(flat.predict_proba, X_test)
+    with open(os.path.join(model_dir, 'model.p'), 'rb') as f:
+        model = pickle.load(f)
+    result['sklearn_latency_ms'] = single_sample_latency(model.predict_proba, X_test)
+
+
+# Fastest model whose accuracy is within the budget of the best one
+def choose(results, budget=ACCURACY_BUDGET):
+    best = max(r['accuracy'] for r in results)
+    eligible = [r for r in results if r['accuracy'] >= best - budget]
+    return min(eligible, key=lambda r: (r['latency_ms'], -r['accuracy']))
+
+
+def print_report(results, chosen):
+    print(f"{'trees':>5} {'depth':>5} {'acc %':>7} {'flat ms':>8} {'sk ms':>7} {'train s':>8} {'nodes':>7}")
+    for r in sorted(results, key=lambda r: r['latency_ms']):
+        mark = ' <-' if r is chosen else ''
+        depth = r['max_depth'] if r['max_depth'] is not None else '-'
+        print(f"{r['n_estimators']:>5} {depth:>5} {r['accuracy'] * 100:>7.2f} "
+              f"{r['latency_ms']:>8.3f} {r['sklearn_latency_ms']:>7.3f} "
+              f"{r['train_s']:>8.2f} {r['nodes']:>7}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the sign classifier")
+    parser.add_argument('--trees', type=int, nargs='+', default=SWEEP_TREES)
+    parser.add_argument('--depths', nargs='+', default=[str(d) for d in SWEEP_DEPTHS],
+                        help="Max depths to try ('None' for unlimited)")
+    parser.add_argument('--budget', type=float, default=ACCURACY_BUDGET,
+                        help="Accuracy loss accepted for a faster model (0.01 = 1 point)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--no-sweep', action='store_true',
+                        help="Train a single 100-tree forest as before")
+    parser.add_argument('--augment', type=int, default=0, metavar='COPIES',
+                        help="Augmented copies per training sample (see augment.py)")
+    parser.add_argument('--mirror-prob', type=float, default=0.0,
+                        help="Fraction of augmented copies that are mirrored")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed for the augmentation generator")
+    args = parser.parse_args()
+
+    # 1. Load Data (cached, memory-mapped copy of hand_data.csv + hand_data/)
+    try:
+        X, y, key = load_dataset_cached()
+    except FileNotFoundError:
+        print("Error: no recorded data found. Run record_data.py first!")
+        exit()
+    print(f"Loaded {len(y)} samples (cache {CACHE_DIR}/dataset_{key}_*.npy)")
+
+    # 2. Sweep model sizes and depths in parallel
+    if args.no_sweep:
+        configs = [(100, None)]
+    else:
+        depths = [None if d.lower() == 'none' else int(d) for d in args.depths]
+        configs = [(t, d) for t in args.trees for d in depths]
+
+    augment_options = {'copies': args.augment, 'seed': args.seed,
+                       'mirror_prob': args.mirror_prob}
+
+    X_test = split(X, y)[1]
+    with tempfile.TemporaryDirectory(prefix='sweep_') as out_dir:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(evaluate, key, t, d, out_dir, augment_options) for t, d in configs]
+            results = [f.result() for f in futures]
+        # Latency is measured with the pool shut down and the cores idle
+        for r in results:
+            measure_latency(r, X_test)
+
+    chosen = choose(results, args.budget)
+    print_report(results, chosen)
+    print(f"Chosen: {chosen['n_estimators']} trees, max_depth={chosen['max_depth']} "
+          f"({chosen['accuracy'] * 100:.2f}%, {chosen['latency_ms']:.3f} ms/sample)")
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump({'dataset': key, 'budget': args.budget, 'augment': augment_options,
+                   'chosen': chosen, 'results': results}, f, indent=2)
+
+    # 3. Train the chosen model
+    X_train, X_test, y_train, y_test = split(X, y)
+    X_train, y_train = augment_train(X_train, y_train, augment_options)
+    if args.augment:
+        print(f"Training on {len(y_train)} samples ({args.augment} augmented copies each)")
+    model = fit(X_train, y_train, chosen['n_estimators'], chosen['max_depth'])
+
+    # 4. Evaluate
+    y_pred = model.predict(X_test)
+    accuracy = accuracy_score(y_test, y_pred)
+    print(f"Model Accuracy: {accuracy * 100:.2f}%")
+
+    # 5. Save Model
+    with open('model.p', 'wb') as f:
+        pickle.dump(model, f)
+
+    print("Success! Model saved to 'model.p'")
+
+    # 6. Export flat arrays for the fast NumPy inference engine
+    export_forest(model, 'model_flat')
+    print("Flat model exported to 'model_flat/'")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,76 @@
+import time
+_inicio_init = time.perf_counter()
+
 import json
-import boto3
+import os
+import uuid
 import logging
+from collections import OrderedDict
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Endpoint IoT Core
 IOT_ENDPOINT = "abcde12345-ats.iot.us-east-1.amazonaws.com" # Reemplaza con el endpoint real
-iot_client = boto3.client("iot-data", endpoint_url=f"https://{IOT_ENDPOINT}")
+
+# Sesiones recordadas y por cuánto tiempo (segundos sin actividad)
+MAX_SESIONES = 1000
+SESION_TTL = 30 * 60
+
+_iot_client = None
+
+# Cliente iot-data: se crea (e importa boto3) solo la primera vez que una
+# invocación lo necesita, y se reutiliza en las invocaciones en caliente
+def get_iot_client():
+    global _iot_client
+    if _iot_client is None:
+        inicio = time.perf_counter()
+        import boto3
+        importado = time.perf_counter()
+        _iot_client = boto3.client("iot-data", endpoint_url=f"https://{IOT_ENDPOINT}")
+        logger.info(
+            f"⏱️ Cliente iot-data: import boto3 {(importado - inicio) * 1000:.1f} ms, "
+            f"creación {(time.perf_counter() - importado) * 1000:.1f} ms"
+        )
+    return _iot_client
+
+
+# Diccionario acotado con expiración: guarda como máximo `max_size`
+# usuarios y olvida los que llevan más de `ttl` segundos sin actividad,
+# para que la memoria no crezca en contenedores de larga vida
+class SesionesTTL:
+    def __init__(self, max_size=MAX_SESIONES, ttl=SESION_TTL, reloj=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.reloj = reloj
+        self._datos = OrderedDict()
+
+    def _purgar(self, ahora):
+        # El orden es de la escritura más antigua a la más reciente
+        while self._datos:
+            clave, (_, expira) = next(iter(self._datos.items()))
+            if expira > ahora and len(self._datos) <= self.max_size:
+                break
+            del self._datos[clave]
+
+    def __setitem__(self, clave, valor):
+        ahora = self.reloj()
+        self._datos[clave] = (valor, ahora + self.ttl)
+        self._datos.move_to_end(clave)
+        self._purgar(ahora)
+
+    def get(self, clave, default=None):
+        item = self._datos.get(clave)
+        if item is None or item[1] <= self.reloj():
+            return default
+        return item[0]
+
+    def __len__(self):
+        return len(self._datos)
+
 
 # Estado temporal de los usuarios (modo activado/desactivado)
-modo_traductor = {}
+modo_traductor = SesionesTTL()
 
 # Diccionario de señas disponiblesa
 SENIAS_COMPLETAS = {
@@ -25,49 +85,107 @@ SENIAS_COMPLETAS = {
     "adiós": {"tipo": "seña"}
 }
 
-def obtener_ultimo_mensaje_robot():    
+# Prefijo de los tópicos para elegir el dispositivo (por ejemplo "stand_2/"
+# publica en stand_2/traductor/plan). Vacío: los tópicos compartidos que
+# escucha mqtt_subscriber.py. Con supervisor.py cada Skill (o despliegue de
+# la Lambda) apunta a un dispositivo con su propio TOPIC_PREFIJO.
+TOPIC_PREFIJO = os.environ.get('TOPIC_PREFIJO', '')
+# Tópico de los planes: la frase completa en un solo mensaje
+TOPIC_PLAN = f"{TOPIC_PREFIJO}traductor/plan"
+# Tópico de control: "stop" cancela lo que la mano esté haciendo
+TOPIC_CONTROL = f"{TOPIC_PREFIJO}traductor/control"
+
+# Señas completas de varias palabras ("te quiero"), para buscar la más larga
+MAX_PALABRAS_SENIA = max(len(s.split()) for s in SENIAS_COMPLETAS)
+
+# Buzón de mensajes del robot en el shadow: `mensajes` es una lista
+# acotada que llena la otra Lambda; la versión del shadow hace que las
+# escrituras sean condicionales y no se pisen entre sí
+BUZON_THING = 'Robot'
+MAX_REINTENTOS = 5
+
+
+def _codigo_error(e):
+    return getattr(e, 'response', {}).get('Error', {}).get('Code')
+
+
+# Una sola lectura: los mensajes pendientes y la versión del shadow
+def leer_buzon():
     try:
-        response = iot_client.get_thing_shadow(thingName='Robot')
-        payload = json.loads(response['payload'].read())
-        # Leemos lo que guardó la otra Lambda
-        palabra = payload['state']['reported'].get('ultima_seña', None)
-        return palabra
+        response = get_iot_client().get_thing_shadow(thingName=BUZON_THING)
     except Exception as e:
-        logger.error(f"No pude leer el shadow: {e}")
-        return None
+        if _codigo_error(e) != 'ResourceNotFoundException':
+            logger.error(f"No pude leer el shadow: {e}")
+        return [], None
+    shadow = json.loads(response['payload'].read())
+    reported = shadow.get('state', {}).get('reported', {})
+    return reported.get('mensajes') or [], shadow.get('version')
 
-def borrar_mensaje_robot():
-    try:
-        payload_borrar = {
-            "state": {
-                "reported": {
-                    "ultima_seña": None 
-                }
-            }
+
+# Quita del buzón los mensajes leídos. La escritura lleva la versión
+# leída; si la otra Lambda agregó algo entretanto (ConflictException) se
+# relee y se quitan solo los mensajes ya leídos, sin perder los nuevos.
+def confirmar_buzon(leidos, version):
+    ids = {m.get('id') for m in leidos}
+    restantes = []
+    for _ in range(MAX_REINTENTOS):
+        estado = {
+            "state": {"reported": {"mensajes": restantes or None, "ultima_seña": None}},
+            "version": version
         }
-        iot_client.update_thing_shadow(
-            thingName='Robot', 
-            payload=json.dumps(payload_borrar)
-        )
-        logger.info("Mensaje marcado como leído (borrado del Shadow).")
-    except Exception as e:
-        logger.error(f"Error borrando mensaje: {e}")
+        try:
+            get_iot_client().update_thing_shadow(
+                thingName=BUZON_THING,
+                payload=json.dumps(estado)
+            )
+            logger.info(f"{len(ids)} mensajes marcados como leídos.")
+            return True
+        except Exception as e:
+            if _codigo_error(e) != 'ConflictException':
+                logger.error(f"Error confirmando mensajes: {e}")
+                return False
+        mensajes, version = leer_buzon()
+        restantes = [m for m in mensajes if m.get('id') not in ids]
+    logger.error("No se pudo confirmar el buzón: demasiados conflictos")
+    return False
+
+# Tramo de latencia como una línea JSON en los logs, con el mismo id de
+# correlación (cid) que viaja en el mensaje hasta la Raspberry Pi
+def registrar_span(cid, nombre, inicio, **extra):
+    ms = (time.time() - inicio) * 1000
+    logger.info(json.dumps({"cid": cid, "span": nombre, "t": inicio, "ms": round(ms, 2), **extra}))
+
 
 def lambda_handler(event, context):
+    cid = uuid.uuid4().hex[:16]
+    inicio = time.time()
+    try:
+        return atender(event, cid)
+    finally:
+        intent = event.get("request", {}).get("intent", {}).get("name")
+        registrar_span(cid, "lambda", inicio, intent=intent)
+
+
+def atender(event, cid):
     logger.info("Evento recibido: %s", json.dumps(event))
     response_text = "No entendí la palabra, intenta de nuevo."
 
     try:
         request = event.get("request", {})
+        # Alexa repite el mismo requestId cuando reintenta la solicitud
+        request_id = request.get("requestId")
         intent_name = request.get("intent", {}).get("name")
         user_id = event.get("session", {}).get("user", {}).get("userId", "anonimo")
 
         # 1. LAUNCH REQUEST
         if request.get("type") == "LaunchRequest":    
-            ultima_palabra = obtener_ultimo_mensaje_robot()
-            if ultima_palabra:
-                texto = f"El robot dice: {ultima_palabra}. ¿Quieres responder?"
-                borrar_mensaje_robot()
+            mensajes, version = leer_buzon()
+            if mensajes:
+                # Se confirma antes de responder: si no, los mismos mensajes
+                # se volverían a leer en la próxima apertura
+                confirmar_buzon(mensajes, version)
+                dichos = ". ".join(m.get('palabra', '') for m in mensajes)
+                texto = f"El robot dice: {dichos}. ¿Quieres responder?"
             else:
                 texto = "Modo traductor activado. Dime una palabra."
             
@@ -76,9 +194,9 @@ def lambda_handler(event, context):
 
         # 2. DESPEDIDA ESPECIAL
         elif intent_name == "DespedidaIntent":
-            # Mandar la orden al robot
-            enviar_senia_completa("gracias")
-            enviar_senia_completa("adiós")
+            # Mandar la orden al robot (un solo plan, en orden). Con
+            # prioridad alta interrumpe lo que el robot esté haciendo
+            enviar_plan(compilar_plan("gracias adiós"), cid, prioridad="alta", request_id=request_id)
             
             # Frase de Alexa y cerrar sesión
             response_text = "El robot se despide de ustedes. Gracias por visitarnos, ¡Hasta pronto! Les desean un buen día el equipo de Código Maestro."
@@ -99,6 +217,7 @@ def lambda_handler(event, context):
 
         # 5. SALIR
         elif intent_name == "DesactivarModoIntent" or intent_name == "AMAZON.StopIntent" or intent_name == "AMAZON.CancelIntent":
+            enviar_control("stop", cid, request_id=request_id)
             modo_traductor[user_id] = False
             response_text = "Modo traductor desactivado. Hasta luego."
             return build_response(response_text, end_session=True)
@@ -114,16 +233,17 @@ def lambda_handler(event, context):
             frase = request["intent"]["slots"]["palabra"]["value"].lower()
             logger.info(f"Frase recibida: {frase}")
 
-            palabras = frase.split()
-            respuestas_acumuladas = [] 
+            pasos = compilar_plan(frase)
+            respuestas_acumuladas = []
 
-            for palabra in palabras:
-                if palabra in SENIAS_COMPLETAS:
-                    enviar_senia_completa(palabra)
-                    respuestas_acumuladas.append(f"Mostrando {palabra}.")
+            for paso in pasos:
+                if paso["modo"] == "seña":
+                    respuestas_acumuladas.append(f"Mostrando {paso['palabra']}.")
                 else:
-                    enviar_palabra_para_deletrear(palabra)
-                    respuestas_acumuladas.append(f"Deletreando {palabra}.")
+                    respuestas_acumuladas.append(f"Deletreando {paso['palabra']}.")
+
+            # Una sola publicación para toda la frase
+            enviar_plan(pasos, cid, request_id=request_id)
 
             response_text = " ".join(respuestas_acumuladas)
             return build_response(response_text, end_session=False)
@@ -141,18 +261,54 @@ def lambda_handler(event, context):
         logger.error("Error procesando la solicitud: %s", e)
         return build_response("Hubo un error técnico. Intenta de nuevo.", end_session=True)
 
-def enviar_senia_completa(palabra):
-    payload = {"modo": "seña", "palabra": palabra}
-    topic = "traductor/mano_izquierda"
-    iot_client.publish(topic=topic, qos=0, payload=json.dumps(payload))
-    logger.info(f"Seña completa enviada: {palabra}")
+# Convierte la frase en pasos ordenados: la seña completa más larga que
+# empiece en cada palabra ("te quiero" antes que "te"), o deletreo
+def compilar_plan(frase):
+    palabras = frase.split()
+    pasos = []
+    i = 0
+    while i < len(palabras):
+        for n in range(min(MAX_PALABRAS_SENIA, len(palabras) - i), 0, -1):
+            candidata = " ".join(palabras[i:i + n])
+            if candidata in SENIAS_COMPLETAS:
+                pasos.append({"orden": len(pasos), "modo": "seña", "palabra": candidata})
+                i += n
+                break
+        else:
+            pasos.append({"orden": len(pasos), "modo": "deletreo", "palabra": palabras[i]})
+            i += 1
+    return pasos
+
+
+# Id del mensaje para el robot: se arma con el requestId de Alexa, que es
+# el mismo en los reintentos, así la Raspberry Pi descarta el repetido.
+# Sin requestId (pruebas a mano) se usa uno nuevo.
+def id_mensaje(request_id, tipo):
+    return f"{request_id}/{tipo}" if request_id else uuid.uuid4().hex
 
 
-def enviar_palabra_para_deletrear(palabra):
-    payload = {"modo": "deletreo", "palabra": palabra}
-    topic = "traductor/deletrear"
-    iot_client.publish(topic=topic, qos=0, payload=json.dumps(payload))
-    logger.info(f"Palabra enviada para deletrear: {palabra}")
+# Publica el plan completo una sola vez, con QoS 1 para que no se pierda
+# (cid y t_envio permiten medir el recorrido completo en la Raspberry Pi)
+def enviar_plan(pasos, cid=None, prioridad="normal", request_id=None):
+    t_envio = time.time()
+    payload = {"id": id_mensaje(request_id, "plan"), "cid": cid, "t_envio": t_envio,
+               "prioridad": prioridad, "pasos": pasos}
+    get_iot_client().publish(topic=TOPIC_PLAN, qos=1, payload=json.dumps(payload))
+    registrar_span(cid, "publicar", t_envio, pasos=len(pasos))
+    logger.info(f"Plan {payload['id']} enviado: {len(pasos)} pasos")
+    return payload["id"]
+
+
+# Orden de control para la mano (por ahora solo "stop")
+def enviar_control(orden, cid=None, request_id=None):
+    payload = {"id": id_mensaje(request_id, "control"), "cid": cid, "t_envio": time.time(),
+               "control": orden}
+    try:
+        get_iot_client().publish(topic=TOPIC_CONTROL, qos=1, payload=json.dumps(payload))
+        logger.info(f"Control enviado: {orden}")
+    except Exception as e:
+        # Salir de la Skill no debe fallar porque el robot no responda
+        logger.error(f"Error enviando control {orden}: {e}")
 
 
 def build_response(output_text, end_session=True):
@@ -162,4 +318,7 @@ def build_response(output_text, end_session=True):
             "outputSpeech": {"type": "PlainText", "text": output_text},
             "shouldEndSession": end_session
         }
-    }
\ No newline at end of file
+    }
+
+
+logger.info(f"⏱️ Init del módulo: {(time.perf_counter() - _inicio_init) * 1000:.1f} ms")
@@ -1,17 +1,36 @@
+import time
+_inicio_init = time.perf_counter()
+
 import json
-import urllib.request
+import http.client
 import urllib.parse
 import os
 import datetime
 import logging
-import boto3
+import uuid
 
 # Configuración de Logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 IOT_ENDPOINT = "abcde12345-ats.iot.us-east-1.amazonaws.com" # Reemplaza con el endpoint real
-iot_client = boto3.client("iot-data", endpoint_url=f"https://{IOT_ENDPOINT}")
+
+_iot_client = None
+
+# Cliente iot-data perezoso: se crea (e importa boto3) en la primera
+# invocación que lo usa y se reutiliza mientras el contenedor siga vivo
+def get_iot_client():
+    global _iot_client
+    if _iot_client is None:
+        inicio = time.perf_counter()
+        import boto3
+        importado = time.perf_counter()
+        _iot_client = boto3.client("iot-data", endpoint_url=f"https://{IOT_ENDPOINT}")
+        logger.info(
+            f"⏱️ Cliente iot-data: import boto3 {(importado - inicio) * 1000:.1f} ms, "
+            f"creación {(time.perf_counter() - importado) * 1000:.1f} ms"
+        )
+    return _iot_client
 
 # ==========================================
 # CONFIGURACIÓN (Desde Variables de Entorno)
@@ -19,84 +38,293 @@ iot_client = boto3.client("iot-data", endpoint_url=f"https://{IOT_ENDPOINT}")
 CLIENT_ID = os.environ.get('ALEXA_CLIENT_ID')
 CLIENT_SECRET = os.environ.get('ALEXA_CLIENT_SECRET')
 
+# Token OAuth reutilizado hasta poco antes de que expire
+TOKEN_MARGEN = 60          # segundos antes de la expiración para renovarlo
+
+OAUTH_HOST = "api.amazon.com"
+ALEXA_HOST = "api.amazonalexa.com"
+HTTP_TIMEOUT = 5
+# Una conexión sin usar más que esto se descarta antes de reutilizarla: el
+# servidor suele cerrar las ociosas y un POST enviado por una conexión ya
+# cerrada no se puede reenviar sin riesgo de duplicarlo
+CONEXION_OCIOSA = 30       # segundos
+
+_token = {"valor": None, "expira": 0.0}
+_conexiones = {}           # host -> (conexión, último uso)
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, status, cuerpo):
+        super().__init__(f"HTTP {status}: {cuerpo}")
+        self.status = status
+
+
+def _cerrar(host, conn):
+    conn.close()
+    _conexiones.pop(host, None)
+
+
+# Conexiones HTTPS keep-alive, una por host, que sobreviven entre
+# invocaciones en caliente: solo el primer request paga el handshake TLS.
+# Solo se reintenta (una vez, con otra conexión) si falló antes de que el
+# request saliera; si falla esperando la respuesta, el servidor pudo
+# haberlo recibido y se propaga el error en vez de enviarlo dos veces.
+def _request(host, method, path, body, headers):
+    for intento in range(2):
+        conn, usada = _conexiones.get(host, (None, 0.0))
+        if conn is not None and time.monotonic() - usada > CONEXION_OCIOSA:
+            _cerrar(host, conn)
+            conn = None
+        if conn is None:
+            conn = http.client.HTTPSConnection(host, timeout=HTTP_TIMEOUT)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+        except (http.client.HTTPException, OSError):
+            # No se pudo conectar o enviar: se abre otra conexión una vez
+            _cerrar(host, conn)
+            if intento:
+                raise
+            continue
+        try:
+            response = conn.getresponse()
+            cuerpo = response.read()
+        except (http.client.HTTPException, OSError):
+            _cerrar(host, conn)
+            raise
+        _conexiones[host] = (conn, time.monotonic())
+        return response.status, cuerpo
+
+
 def get_access_token():
-    url = "https://api.amazon.com/auth/o2/token"
+    ahora = time.time()
+    if _token["valor"] and ahora < _token["expira"] - TOKEN_MARGEN:
+        return _token["valor"]
+
     data = urllib.parse.urlencode({
         "grant_type": "client_credentials",
         "client_id": CLIENT_ID,
         "client_secret": CLIENT_SECRET,
         "scope": "alexa::proactive_events"
-    }).encode("utf-8")
+    })
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    status, cuerpo = _request(OAUTH_HOST, "POST", "/auth/o2/token", data, headers)
+    if status != 200:
+        logger.error(f"Error obteniendo token: {cuerpo.decode()}")
+        raise ErrorHTTP(status, cuerpo.decode())
 
-    req = urllib.request.Request(url, data=data, method="POST")
-    
-    try:
-        with urllib.request.urlopen(req) as response:
-            response_body = json.loads(response.read())
-            return response_body.get("access_token")
-    except urllib.error.HTTPError as e:
-        logger.error(f"Error obteniendo token: {e.read().decode()}")
-        raise e
-
-def send_proactive_event(token):
+    response_body = json.loads(cuerpo)
+    _token["valor"] = response_body.get("access_token")
+    _token["expira"] = ahora + response_body.get("expires_in", 3600)
+    return _token["valor"]
+
+
+def send_proactive_event(token, count=1):
     # IMPORTANTE: Usamos el endpoint de desarrollo. 
-    url = "https://api.amazonalexa.com/v1/proactiveEvents/stages/development"
+    path = "/v1/proactiveEvents/stages/development"
     now = datetime.datetime.utcnow()
     expiry = now + datetime.timedelta(hours=1)
     
     payload = {
         "timestamp": now.strftime("%Y-%m-%dT%H:%M:%S.00Z"),
-        "referenceId": f"sign-{int(now.timestamp())}",
+        "referenceId": f"sign-{int(now.timestamp() * 1000)}",
         "expiryTime": expiry.strftime("%Y-%m-%dT%H:%M:%S.00Z"),
         "event": {
             "name": "AMAZON.MessageAlert.Activated",
             "payload": {
                 "state": {"status": "UNREAD", "freshness": "NEW"},
-                "messageGroup": {"creator": {"name": "Robot"}, "count": 1}
+                "messageGroup": {"creator": {"name": "Robot"}, "count": count}
             }
         },
         "relevantAudience": {"type": "Multicast", "payload": {}}
     }
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
-    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
-    with urllib.request.urlopen(req) as response:
-        return response.status
-    
+    status, cuerpo = _request(ALEXA_HOST, "POST", path, json.dumps(payload), headers)
+    if status >= 300:
+        if status == 401:
+            # Token revocado antes de tiempo: el siguiente se pide de nuevo
+            _token["valor"] = None
+        logger.error(f"Error enviando evento a Alexa: {cuerpo.decode()}")
+        raise ErrorHTTP(status, cuerpo.decode())
+    logger.info(f"Notificación enviada. Status Code: {status}")
+    return status
+
+
+# Buzón del robot en el shadow: lista acotada de mensajes sin leer
+BUZON_THING = 'Robot'
+MAX_MENSAJES = 20          # se descartan los más antiguos si nadie los lee
+MAX_REINTENTOS = 5
+# Después de un aviso, las detecciones de esta ventana no envían otro: se
+# agrupan hasta la primera detección posterior, que avisa con el total.
+# La ventana se guarda en el shadow (aviso.t), así la comparten todas las
+# invocaciones y contenedores.
+VENTANA_AGRUPAR = 30       # segundos
+# Ids de los últimos mensajes del detector que se guardaron. La cola de
+# salida del detector reenvía si no llega la confirmación (PUBACK), así que
+# el mismo mensaje puede llegar dos veces: con su id se descarta el repetido
+# aunque el buzón ya se haya leído.
+MAX_IDS_RECIBIDOS = 50
+
+
+def _codigo_error(e):
+    return getattr(e, 'response', {}).get('Error', {}).get('Code')
+
+
+# Estado reportado del shadow y su versión (None si todavía no existe)
+def leer_estado():
+    try:
+        response = get_iot_client().get_thing_shadow(thingName=BUZON_THING)
+    except Exception as e:
+        if _codigo_error(e) == 'ResourceNotFoundException':
+            return {}, None
+        raise
+    shadow = json.loads(response['payload'].read())
+    return shadow.get('state', {}).get('reported', {}), shadow.get('version')
+
+
+# Agrega la palabra al final del buzón con una escritura condicional a la
+# versión leída; si otra invocación escribió antes (ConflictException),
+# se relee y se reintenta, así ningún mensaje pisa a otro.
+# Devuelve el mensaje guardado (None si `mensaje_id` ya se había recibido),
+# el estado reportado resultante y su versión, para que notificar() no
+# tenga que volver a leer el shadow.
+def guardar_en_buzon(palabra, mensaje_id=None):
+    mensaje = {
+        "id": mensaje_id or uuid.uuid4().hex[:12],
+        "palabra": palabra,
+        "timestamp": str(datetime.datetime.now())
+    }
+    for _ in range(MAX_REINTENTOS):
+        reported, version = leer_estado()
+        if version is None:
+            # Shadow inexistente: se crea sin tocar `mensajes` (una escritura
+            # sin versión podría pisar la de otra invocación) y se reintenta
+            get_iot_client().update_thing_shadow(
+                thingName=BUZON_THING,
+                payload=json.dumps({"state": {"reported": {"buzon": 1}}})
+            )
+            continue
+        recibidos = reported.get('recibidos') or []
+        if mensaje_id and mensaje_id in recibidos:
+            logger.info(f"Mensaje {mensaje_id} repetido: ya se guardó")
+            return None, reported, version
+        mensajes = ((reported.get('mensajes') or []) + [mensaje])[-MAX_MENSAJES:]
+        cambios = {
+            "mensajes": mensajes,
+            "ultima_seña": palabra,
+            "timestamp": mensaje["timestamp"]
+        }
+        if mensaje_id:
+            cambios["recibidos"] = (recibidos + [mensaje_id])[-MAX_IDS_RECIBIDOS:]
+        try:
+            response = get_iot_client().update_thing_shadow(
+                thingName=BUZON_THING,
+                payload=json.dumps({"state": {"reported": cambios}, "version": version})
+            )
+        except Exception as e:
+            if _codigo_error(e) != 'ConflictException':
+                raise
+            logger.info("Conflicto de versión en el shadow, reintentando...")
+            continue
+        version = json.loads(response['payload'].read()).get('version')
+        return mensaje, {**reported, **cambios}, version
+    raise RuntimeError(f"No se pudo guardar '{palabra}': demasiados conflictos")
+
+
+# Avisa a Alexa de los mensajes sin leer del buzón, con la cantidad que hay
+# en él. No avisa si el buzón está vacío, si el último aviso ya cubre el
+# mensaje más nuevo o si fue hace menos de VENTANA_AGRUPAR segundos.
+# Antes de enviar reserva la ventana con una escritura condicional a la
+# versión: si otra invocación escribió en el medio, se relee y se decide
+# de nuevo, así dos detecciones simultáneas no envían dos avisos.
+def notificar(reported, version):
+    for _ in range(MAX_REINTENTOS):
+        mensajes = reported.get('mensajes') or []
+        if not mensajes:
+            # Ya se leyeron: no hay nada que avisar
+            return False
+        ultimo_id = mensajes[-1]['id']
+        anterior = reported.get('aviso') or {}
+        if anterior.get('ultimo_id') == ultimo_id:
+            logger.info(f"Aviso ya enviado para los {len(mensajes)} mensajes sin leer")
+            return False
+        hace = time.time() - anterior.get('t', 0)
+        if hace < VENTANA_AGRUPAR:
+            logger.info(f"Último aviso hace {hace:.0f}s: se agrupa con el siguiente")
+            return False
+
+        count = len(mensajes)
+        aviso = {"ultimo_id": ultimo_id, "count": count, "t": time.time()}
+        try:
+            get_iot_client().update_thing_shadow(
+                thingName=BUZON_THING,
+                payload=json.dumps({"state": {"reported": {"aviso": aviso}}, "version": version})
+            )
+        except Exception as e:
+            if _codigo_error(e) != 'ConflictException':
+                raise
+            reported, version = leer_estado()
+            continue
+        break
+    else:
+        raise RuntimeError("No se pudo reservar el aviso: demasiados conflictos")
+
     try:
-        with urllib.request.urlopen(req) as response:
-            logger.info(f"Notificación enviada. Status Code: {response.status}")
-            return response.status
-    except urllib.error.HTTPError as e:
-        logger.error(f"Error enviando evento a Alexa: {e.read().decode()}")
-        raise e
+        try:
+            send_proactive_event(get_access_token(), count=count)
+        except ErrorHTTP as e:
+            if e.status != 401:
+                raise
+            send_proactive_event(get_access_token(), count=count)
+    except Exception:
+        # No salió: se libera la ventana para que la próxima detección avise
+        get_iot_client().update_thing_shadow(
+            thingName=BUZON_THING,
+            payload=json.dumps({"state": {"reported": {"aviso": anterior or None}}})
+        )
+        raise
+    return True
+
+
+# Tramo de latencia como una línea JSON en los logs; el cid y t_envio
+# llegan en el mensaje del detector (robot/sign_detected)
+def registrar_span(cid, nombre, inicio, **extra):
+    ms = (time.time() - inicio) * 1000
+    logger.info(json.dumps({"cid": cid, "span": nombre, "t": inicio, "ms": round(ms, 2), **extra}))
+
 
 def lambda_handler(event, context):
+    inicio = time.time()
     logger.info("Evento recibido: %s", json.dumps(event))
     palabra = event.get("palabra", "desconocida")
+    cid = event.get("cid") or uuid.uuid4().hex[:16]
+    t_envio = event.get("t_envio")
+    if isinstance(t_envio, (int, float)):
+        registrar_span(cid, "transporte", t_envio)
     
     try:
         # 1. GUARDAR EN EL BUZÓN (SHADOW)
         logger.info(f"Guardando '{palabra}' en Shadow...")
-        payload_shadow = {
-            "state": {
-                "reported": {
-                    "ultima_seña": palabra,
-                    "timestamp": str(datetime.datetime.now())
-                }
-            }
-        }
-        iot_client.update_thing_shadow(
-            thingName='Robot', 
-            payload=json.dumps(payload_shadow)
-        )
+        paso = time.time()
+        mensaje, reported, version = guardar_en_buzon(palabra, event.get("id"))
+        registrar_span(cid, "buzon", paso, repetido=mensaje is None)
+        if mensaje is None:
+            return {'statusCode': 200, 'body': "Mensaje repetido"}
         
         # 2. TOCAR EL TIMBRE (Notificar a Alexa)
         if CLIENT_ID and CLIENT_SECRET:
-            token = get_access_token()
-            send_proactive_event(token)
+            paso = time.time()
+            enviado = notificar(reported, version)
+            registrar_span(cid, "aviso", paso, enviado=enviado)
         
         return {'statusCode': 200, 'body': "Guardado y Notificado"}
         
     except Exception as e:
         logger.error(f"Error: {e}")
-        return {'statusCode': 500, 'body': str(e)}
\ No newline at end of file
+        return {'statusCode': 500, 'body': str(e)}
+    finally:
+        registrar_span(cid, "lambda", inicio)
+        if isinstance(t_envio, (int, float)):
+            registrar_span(cid, "total", t_envio)
+
+
+logger.info(f"⏱️ Init del módulo: {(time.perf_counter() - _inicio_init) * 1000:.1f} ms")
@@ -0,0 +1,143 @@
+import argparse
+import io
+import json
+import threading
+import time
+
+# Sustituto en memoria del cliente "iot-data" de boto3 para probar y medir
+# el buzón del shadow sin AWS. Implementa get_thing_shadow y
+# update_thing_shadow con las mismas reglas que el servicio:
+#   - las actualizaciones se mezclan con el estado (None borra la clave,
+#     las listas se reemplazan completas)
+#   - cada actualización incrementa `version`
+#   - si la actualización trae "version" y no coincide, ConflictException
+#
+# Uso en las Lambdas:
+#   import AlexaToIoT_Publisher, IoTToAlexa_Notifier
+#   shadow = ShadowLocal()
+#   AlexaToIoT_Publisher._iot_client = shadow
+#   IoTToAlexa_Notifier._iot_client = shadow
+
+
+# Mismo formato que botocore.exceptions.ClientError: e.response['Error']['Code']
+class ErrorShadow(Exception):
+    def __init__(self, codigo, mensaje):
+        super().__init__(f"{codigo}: {mensaje}")
+        self.response = {'Error': {'Code': codigo, 'Message': mensaje}}
+
+
+def _mezclar(destino, cambios):
+    for clave, valor in cambios.items():
+        if valor is None:
+            destino.pop(clave, None)
+        elif isinstance(valor, dict) and isinstance(destino.get(clave), dict):
+            _mezclar(destino[clave], valor)
+        else:
+            destino[clave] = valor
+
+
+class ShadowLocal:
+    def __init__(self, latencia=0.0):
+        # latencia: segundos simulados de ida y vuelta por llamada
+        self.latencia = latencia
+        self.things = {}
+        self.llamadas = {'get': 0, 'update': 0}
+        self.conflictos = 0
+        self._lock = threading.Lock()
+
+    def _red(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def get_thing_shadow(self, thingName):
+        self._red()
+        with self._lock:
+            self.llamadas['get'] += 1
+            shadow = self.things.get(thingName)
+            if shadow is None:
+                raise ErrorShadow('ResourceNotFoundException', f"No shadow exists with name: '{thingName}'")
+            documento = json.dumps({
+                'state': shadow['state'],
+                'version': shadow['version'],
+                'timestamp': int(time.time()),
+            })
+        return {'payload': io.BytesIO(documento.encode())}
+
+    def update_thing_shadow(self, thingName, payload):
+        cambios = json.loads(payload)
+        self._red()
+        with self._lock:
+            self.llamadas['update'] += 1
+            shadow = self.things.setdefault(thingName, {'state': {}, 'version': 0})
+            esperada = cambios.get('version')
+            if esperada is not None and esperada != shadow['version']:
+                self.conflictos += 1
+                raise ErrorShadow('ConflictException', 'Version conflict')
+            _mezclar(shadow['state'], cambios.get('state', {}))
+            shadow['version'] += 1
+            documento = json.dumps({'state': cambios.get('state', {}), 'version': shadow['version']})
+        return {'payload': io.BytesIO(documento.encode())}
+
+
+# Benchmark: varias invocaciones del notifier escriben en paralelo mientras
+# el publisher lee y confirma el buzón. Verifica que ningún mensaje se
+# pierda ni se lea dos veces y reporta llamadas y conflictos.
+def main():
+    import AlexaToIoT_Publisher as publisher
+    import IoTToAlexa_Notifier as notifier
+
+    parser = argparse.ArgumentParser(description="Benchmark del buzón del shadow en memoria")
+    parser.add_argument('--escritores', type=int, default=4)
+    parser.add_argument('--mensajes', type=int, default=25, help="Mensajes por escritor")
+    parser.add_argument('--latencia', type=float, default=0.005, help="Segundos por llamada")
+    parser.add_argument('--intervalo', type=float, default=0.05, help="Segundos entre lecturas")
+    args = parser.parse_args()
+
+    shadow = ShadowLocal(latencia=args.latencia)
+    publisher._iot_client = shadow
+    notifier._iot_client = shadow
+    # Sin límite de reintentos ni de tamaño: el benchmark mide conflictos
+    notifier.MAX_REINTENTOS = publisher.MAX_REINTENTOS = 1000
+    notifier.MAX_MENSAJES = args.escritores * args.mensajes
+
+    enviados = []
+    recibidos = []
+    lecturas = []
+
+    def escritor(n):
+        for i in range(args.mensajes):
+            enviados.append(notifier.guardar_en_buzon(f"w{n}-{i}")[0]['id'])
+
+    def leer():
+        inicio = time.perf_counter()
+        mensajes, version = publisher.leer_buzon()
+        if mensajes:
+            publisher.confirmar_buzon(mensajes, version)
+        lecturas.append(time.perf_counter() - inicio)
+        recibidos.extend(m['id'] for m in mensajes)
+
+    hilos = [threading.Thread(target=escritor, args=(n,)) for n in range(args.escritores)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    while any(hilo.is_alive() for hilo in hilos):
+        leer()
+        time.sleep(args.intervalo)
+    leer()
+    total = time.perf_counter() - inicio
+
+    perdidos = len(set(enviados) - set(recibidos))
+    duplicados = len(recibidos) - len(set(recibidos))
+    lecturas.sort()
+    print(f"Mensajes: {len(enviados)} enviados, {len(recibidos)} leídos, "
+          f"{perdidos} perdidos, {duplicados} duplicados")
+    print(f"Llamadas: {shadow.llamadas['get']} get, {shadow.llamadas['update']} update, "
+          f"{shadow.conflictos} conflictos en {total:.2f}s")
+    print(f"Lectura + confirmación: p50={lecturas[len(lecturas) // 2] * 1000:.1f} ms "
+          f"max={lecturas[-1] * 1000:.1f} ms ({len(lecturas)} lecturas)")
+    if perdidos or duplicados:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
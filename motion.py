@@ -0,0 +1,54 @@
+import math
+import time
+
+# Velocidad segura de los servos, en unidades de pulso por milisegundo
+# (los servos del LeArm recorren unos 2000 pulsos en ~0.5 s)
+SERVO_SPEED = 3.0
+
+# Tiempo mínimo de un cuadro de transición, en ms
+MIN_TRANSITION_MS = 20
+
+# Tiempo que se mantiene la posición final para que la seña se lea, en ms
+HOLD_MS = 250
+
+
+# Tiempo mínimo para ir de un cuadro a otro según el servo que más se mueve
+def transition_time(prev_frame, next_frame, speed=SERVO_SPEED, minimum=MIN_TRANSITION_MS):
+    delta = max((abs(a - b) for a, b in zip(prev_frame, next_frame)), default=0)
+    return max(minimum, math.ceil(delta / speed))
+
+
+# Planificador de movimiento de una mano. Recuerda la última posición
+# enviada y enlaza el final de una seña con el inicio de la siguiente
+# usando solo el tiempo que necesitan los servos, sin pausas fijas.
+class MotionPlanner:
+    def __init__(self, set_servo, sleep=time.sleep, speed=SERVO_SPEED, hold_ms=HOLD_MS):
+        self.set_servo = set_servo
+        self.sleep = sleep
+        self.speed = speed
+        self.hold_ms = hold_ms
+        self.pose = None
+
+    # Envía un cuadro a todos los servos y espera a que termine
+    def move(self, frame, duration):
+        for servo, pulse in enumerate(frame, start=1):
+            self.set_servo(servo, pulse, duration)
+        self.sleep(duration / 1000.0)
+        self.pose = frame
+
+    def play(self, group):
+        for i in range(len(group)):
+            frame = group.frame(i)
+            if self.pose is None:
+                duration = group.times[i]
+            elif i == 0:
+                # Transición entre señas: directo desde la pose actual
+                duration = transition_time(self.pose, frame, self.speed)
+            else:
+                duration = max(group.times[i], transition_time(self.pose, frame, self.speed))
+            self.move(frame, duration)
+        self.sleep(self.hold_ms / 1000.0)
+
+    # La mano se movió por fuera del planificador (p. ej. runActionGroup)
+    def reset(self):
+        self.pose = None
@@ -1,111 +1,117 @@
 import paho.mqtt.client as mqtt
+import os
 import ssl
 import json
-import time
-from unidecode import unidecode
 
-# LeArm es una librería incluída en el dispositivo uHandPi
-from LeArm import initLeArm
-
-from sign2talk import load_signs, phrase_to_signs, play_sign
+from sign2talk import PEER_SIGN_ENV, load_peer_signs, load_signs, sign_duration, SignPlayer
+from scheduler import HandScheduler
+from servo_backend import get_backend
+from tracing import Tracer
 
 # Variables de configuración
 ENDPOINT = "abcdefg123456-ats.iot.us-east-1.amazonaws.com"
 PORT = 8883
-TOPICS = ["traductor/mano_izquierda", "traductor/mano_derecha", "traductor/deletrear"]
+TOPICS = ["traductor/mano_izquierda", "traductor/mano_derecha", "traductor/deletrear",
+          "traductor/plan", "traductor/control"]
+# Los planes (frase completa en un mensaje) y los controles (stop) se
+# reciben con QoS 1
+TOPIC_QOS = {"traductor/plan": 1, "traductor/control": 1}
 
 CA_PATH = "AmazonRootCA1.pem"
 CERT_PATH = "certificate.pem.crt"
 KEY_PATH = "private.pem.key"
 
-# Ruta donde están ubicadas las señas disponibles
-SIGN_PATH = "/home/pi/uHand_Pi/ActionGroups/Letters"
-signs = load_signs(SIGN_PATH)
-
-# Inicializar el brazo en la posición 0
-initLeArm([0, 0, 0, 0, 0, 0])
-
-# Tiempos de espera para las señas del brazo opuesto
-sleep_times = {
-    "w": 0.5,
-    "k": 0.5,
-    "m": 0.5,
-    "permiso": 3.5,
-    "n": 0.5,
-    "porfavor": 0.5,
-    "corazon": 0.5,
-    "x": 0.5,
-    "ll": 1.5,
-    "z": 2.0,
-    "s": 0.5,
-    "t": 0.5,
-    "j": 1.5,
-    "diff": 1.5,
-    "p": 0.5,
-    "r": 0.5,
-    "i": 1.0,
-    "v": 1.5,
-    "q": 0.5,
-    "no": 3.0,
-    "l": 0.5,
-    "permiso": 3.5,
-    "gracias": 2.5,
-    "y": 0.5,
-    "o": 0.5,
-    "si": 2.0,
-    "ñ": 1.5,
-    "u": 0.5,
-    "rr": 1.5,
+# Cola de reproducción: tamaño máximo y política cuando se llena
+# ("drop_oldest", "reject" o "block")
+QUEUE_SIZE = 32
+QUEUE_POLICY = "drop_oldest"
+
+# Mensajes repetidos (mismo id) dentro de esta ventana se descartan, y los
+# que llevan más de MAX_EDAD segundos desde que los envió la Lambda ya no
+# se ejecutan
+DEDUP_SIZE = 256
+DEDUP_VENTANA = 300
+MAX_EDAD = 60
+
+# Manos que maneja este equipo y la ruta de sus señas disponibles.
+# Las señas que existen en ambas manos se ejecutan sincronizadas.
+HANDS = {
+    "izquierda": "/home/pi/uHand_Pi/ActionGroups/Letters",
+}
+hand_signs = {name: load_signs(path) for name, path in HANDS.items()}
+
+# Copia de los archivos .d6a de la otra mano, que maneja otro equipo
+# (la mano derecha de TOPIC_HANDS), en la carpeta de la variable de
+# entorno SIGN2TALK_PEER_SIGNS. En las señas de dos manos se espera lo que
+# la seña de la otra mano dura más que la propia; si la carpeta falta se
+# avisa y se ejecutan sin esperarla.
+PEER_SIGN_PATH = os.environ.get(PEER_SIGN_ENV)
+peer_signs = load_peer_signs(PEER_SIGN_PATH)
+
+# Mano que ejecuta los mensajes de cada tópico
+TOPIC_HANDS = {
+    "traductor/mano_izquierda": "izquierda",
+    "traductor/mano_derecha": "derecha",
+    "traductor/deletrear": "izquierda",
+    "traductor/plan": "izquierda",
+    "traductor/control": "izquierda",
 }
 
+# Trazas de latencia: histogramas en http://<pi>:METRICS_PORT/metrics y
+# cada tramo en un archivo rotativo (None para desactivar cualquiera)
+METRICS_PORT = 9108
+TRACE_FILE = "trazas.jsonl"
+tracer = Tracer(TRACE_FILE)
+if METRICS_PORT:
+    tracer.serve(METRICS_PORT)
+
+# Inicializar el brazo en la posición 0. El backend se elige con la
+# variable de entorno SIGN2TALK_BACKEND ("learm" o "virtual")
+backend = get_backend()
+
 
 # Callback: Al conectarse al broker
 def on_connect(client, userdata, flags, rc, properties=None):
     if rc == 0:
         print("✅ Conectado correctamente al IoT Core")
         for topic in TOPICS:
-            client.subscribe(topic)
+            client.subscribe(topic, qos=TOPIC_QOS.get(topic, 0))
             print(f"📡 Suscrito al topic: {topic}")
     else:
         print(f"❌ Error de conexión: {rc}")
 
 
+scheduler = HandScheduler(
+    hands={name: (signs, SignPlayer(backend)) for name, signs in hand_signs.items()},
+    topic_hands=TOPIC_HANDS,
+    duration=sign_duration,
+    peer_signs=peer_signs,
+    queue_size=QUEUE_SIZE,
+    policy=QUEUE_POLICY,
+    sleep=backend.sleep,
+    on_event=tracer.on_event,
+    dedup_size=DEDUP_SIZE,
+    dedup_window=DEDUP_VENTANA,
+    max_age=MAX_EDAD,
+)
+scheduler.start()
+
+
 # Callback: Al recibir un mensaje
+# Solo decodifica y encola, para no bloquear el loop de red de MQTT
 def on_message(client, userdata, msg):
-    payload = json.loads(msg.payload.decode())
-    modo = payload.get("modo")
-
     try:
-        if modo == "seña":
-            palabra = payload.get("palabra", "")
-            print(f"🤟 Ejecutando seña completa: {palabra}")
-            sequence = phrase_to_signs(unidecode(palabra), signs)
-            for s in sequence:
-                play_sign(s)
-            if unidecode(palabra) in sleep_times:
-                time.sleep(sleep_times[unidecode(palabra)])
-                time.sleep(1)
-            time.sleep(0.7)
-            print(f"✅ Seña {palabra} completada.\n")
-
-        elif modo == "deletreo":
-            palabra = payload.get("palabra", "")
-            print(f"🔠 Deletreando palabra: {palabra}")
-            for letra in palabra:
-                sequence = phrase_to_signs(unidecode(letra), signs)
-                print(f"➡️ Mostrando letra: {letra}")
-                for s in sequence:
-                    play_sign(s)
-                if unidecode(letra) in sleep_times:
-                    time.sleep(sleep_times[letra])
-                    time.sleep(1)
-                time.sleep(0.7)
-            print(f"✅ Deletreo completo de '{palabra}'\n")
-
-        else:
-            print(f"⚠️ Modo no reconocido: {modo}")
-    except Exception as e:
-        print(f"{e}")
+        payload = json.loads(msg.payload.decode())
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        print(f"⚠️ Mensaje inválido en {msg.topic}: {e}")
+        return
+    if not isinstance(payload, dict):
+        print(f"⚠️ Mensaje inválido en {msg.topic}: se esperaba un objeto JSON")
+        return
+
+    tracer.recibido(payload)
+    scheduler.submit(payload, msg.topic)
+    tracer.encolado(payload)
 
 
 # Cliente MQTT
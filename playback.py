@@ -0,0 +1,122 @@
+import threading
+from collections import deque
+
+# Políticas cuando la cola de reproducción está llena:
+#   "drop_oldest" -> se descarta el mensaje más antiguo pendiente
+#   "reject"      -> se descarta el mensaje nuevo
+#   "block"       -> el productor espera hasta que haya espacio (con timeout)
+POLICIES = ("drop_oldest", "reject", "block")
+
+
+# Cola acotada para desacoplar el hilo de red MQTT de la reproducción.
+# Cada elemento tiene una prioridad: se saca primero el de mayor
+# prioridad y, dentro de la misma, el más antiguo.
+class PlaybackQueue:
+    def __init__(self, maxsize=32, policy="drop_oldest", block_timeout=1.0, on_drop=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Política no válida: {policy}")
+        if maxsize < 1:
+            raise ValueError("maxsize debe ser al menos 1")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        # prioridad -> elementos en orden de llegada
+        self._items = {}
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+        # on_drop(elemento): se llama (fuera del lock) con el elemento que
+        # "drop_oldest" saca de la cola para hacer lugar
+        self.on_drop = on_drop
+
+    def __len__(self):
+        with self._cond:
+            return self._size
+
+    # Saca el más antiguo de la prioridad `pick` (max o min) con elementos
+    def _pop(self, pick):
+        priority = pick(p for p, items in self._items.items() if items)
+        self._size -= 1
+        return self._items[priority].popleft()
+
+    # Encola un elemento; devuelve False si se descartó
+    def put(self, item, priority=0):
+        accepted, evicted = self._put(item, priority)
+        if evicted is not None and self.on_drop:
+            self.on_drop(evicted)
+        return accepted
+
+    # Devuelve (encolado, elemento sacado para hacer lugar o None)
+    def _put(self, item, priority):
+        evicted = None
+        with self._cond:
+            if self._closed:
+                return False, None
+            if self._size >= self.maxsize:
+                if self.policy == "reject":
+                    self.dropped += 1
+                    return False, None
+                if self.policy == "drop_oldest":
+                    # Se descarta el más antiguo de menor prioridad
+                    evicted = self._pop(min)
+                    self.dropped += 1
+                else:
+                    has_room = self._cond.wait_for(
+                        lambda: self._closed or self._size < self.maxsize,
+                        timeout=self.block_timeout,
+                    )
+                    if not has_room or self._closed:
+                        self.dropped += 1
+                        return False, None
+            self._items.setdefault(priority, deque()).append(item)
+            self._size += 1
+            self._cond.notify_all()
+            return True, evicted
+
+    # Saca el siguiente elemento; devuelve None si la cola se cerró
+    def get(self, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self._size or self._closed, timeout=timeout)
+            if not self._size:
+                return None
+            item = self._pop(max)
+            self._cond.notify_all()
+            return item
+
+    # Quita los elementos pendientes que cumplen `match` (todos si es None)
+    # y los devuelve
+    def discard(self, match=None):
+        removed = []
+        with self._cond:
+            for priority, items in self._items.items():
+                keep = deque()
+                for item in items:
+                    (removed if match is None or match(item) else keep).append(item)
+                self._items[priority] = keep
+            self._size -= len(removed)
+            self._cond.notify_all()
+        return removed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+# Hilo dedicado que consume la cola y ejecuta cada elemento con `handler`
+class PlaybackWorker(threading.Thread):
+    def __init__(self, queue, handler, name="playback"):
+        super().__init__(name=name, daemon=True)
+        self.queue = queue
+        self.handler = handler
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.handler(item)
+            except Exception as e:
+                print(f"❌ Error en reproducción: {e}")
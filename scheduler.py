@@ -0,0 +1,375 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from unidecode import unidecode
+
+from playback import PlaybackQueue, PlaybackWorker
+
+# Modos de un mensaje (o de cada paso de un plan)
+MODOS = ("seña", "deletreo")
+
+# Prioridades: un mensaje de prioridad alta (la despedida) pasa delante de
+# los pendientes e interrumpe al que se está ejecutando si es de menor
+# prioridad. El control "stop" cancela todo lo que haya en las manos.
+PRIORIDADES = {"normal": 0, "alta": 1}
+CONTROLES = ("stop",)
+
+
+# Punto de encuentro entre las manos para una seña que usa ambas
+class JointSync:
+    def __init__(self, parties, timeout):
+        self.start = threading.Barrier(parties, timeout=timeout)
+        self.end = threading.Barrier(parties, timeout=timeout)
+
+
+# Paso de una mano: una seña (o letra) con sus archivos .d6a
+class Step:
+    def __init__(self, name, files, sync=None, wait=0.0):
+        self.name = name
+        self.files = files
+        self.sync = sync
+        self.wait = wait
+
+
+# Trabajo encolado en una mano: los pasos que le tocan de un mensaje.
+# Se puede cancelar; se revisa antes de cada paso.
+class Job:
+    def __init__(self, title, done, steps, payload=None, priority=0, created=0.0):
+        self.title = title
+        self.done = done
+        self.steps = steps
+        self.payload = payload
+        self.priority = priority
+        self.created = created
+        self.cancelled = threading.Event()
+        # Jobs del mismo mensaje en todas las manos (incluido este)
+        self.group = [self]
+
+    def cancel(self):
+        self.cancelled.set()
+        # Libera a la otra mano si está esperando en una seña de dos manos
+        for step in self.steps:
+            if step.sync:
+                step.sync.start.abort()
+                step.sync.end.abort()
+
+
+# Planificador de dos manos: cada mano tiene su propia cola y su propio
+# hilo, así que las señas independientes corren en paralelo y solo las
+# señas de dos manos se sincronizan entre ambas.
+class HandScheduler:
+    def __init__(
+        self,
+        hands,
+        topic_hands,
+        duration,
+        peer_signs=None,
+        queue_size=32,
+        policy="drop_oldest",
+        step_pause=0.0,
+        joint_timeout=30.0,
+        sleep=time.sleep,
+        on_event=None,
+        dedup_size=256,
+        dedup_window=300.0,
+        max_age=None,
+        clock=time.time,
+    ):
+        # hands: nombre de la mano -> (señas disponibles, función para reproducir)
+        self.hands = hands
+        self.topic_hands = topic_hands
+        # duration(ruta) -> segundos de la seña; se consulta al planificar,
+        # así una seña editada (que la caché recarga) no queda con la
+        # duración vieja
+        self.duration = duration
+        # peer_signs: copia de las señas de la mano que maneja otro equipo
+        # (clave -> ruta). Es obligatoria si algún tópico es de una mano que
+        # no está en este proceso: sin ella las señas de dos manos no
+        # esperarían a la otra mano. {} la desactiva a propósito.
+        remote = sorted({hand for hand in topic_hands.values() if hand not in hands})
+        if remote and peer_signs is None:
+            raise ValueError(
+                f"La mano {', '.join(remote)} está en otro equipo: hacen falta sus señas "
+                f"(peer_signs) para esperarla en las señas de dos manos"
+            )
+        self.peer_signs = peer_signs or {}
+        self.step_pause = step_pause
+        self.joint_timeout = joint_timeout
+        self.sleep = sleep
+        # on_event(evento, mano, job, paso): "job_start", "step_start",
+        # "step_done", "job_done", "job_cancelled" y "job_stale", para
+        # medir la reproducción
+        self.on_event = on_event
+        # Ids de mensajes ya recibidos (LRU acotada) para descartar
+        # reenvíos de QoS 1 y reintentos de Alexa dentro de la ventana
+        self.dedup_size = dedup_size
+        self.dedup_window = dedup_window
+        self._seen = OrderedDict()
+        # Segundos tras los cuales un mensaje ya no se ejecuta (None = nunca)
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+        # Trabajo que ejecuta cada mano en este momento
+        self.current = {name: None for name in hands}
+        self.default_hand = next(iter(hands))
+        self.queues = {
+            name: PlaybackQueue(maxsize=queue_size, policy=policy, on_drop=partial(self._dropped, name))
+            for name in hands
+        }
+        self.workers = {
+            name: PlaybackWorker(q, partial(self._run_job, name), name=f"mano_{name}")
+            for name, q in self.queues.items()
+        }
+
+    def start(self):
+        for worker in self.workers.values():
+            worker.start()
+
+    def stop(self):
+        for q in self.queues.values():
+            q.close()
+
+    # Mano que ejecuta un tópico; si no la maneja este proceso, la primera
+    def hand_for(self, topic):
+        hand = self.topic_hands.get(topic)
+        return hand if hand in self.hands else self.default_hand
+
+    # Reparte los pasos del mensaje entre las colas de cada mano.
+    # Un mensaje con "pasos" es un plan: una frase completa que se
+    # ejecuta como una unidad, en orden.
+    def submit(self, payload, topic):
+        if self._duplicate(payload):
+            print(f"♻️ Mensaje repetido descartado: {payload.get('id')}")
+            return False
+        # El id se recuerda solo si el mensaje se aceptó: un reintento de uno
+        # rechazado (vencido, modo inválido, cola llena) debe poder entrar
+        accepted = self._submit(payload, topic)
+        if accepted:
+            self._remember(payload)
+        return accepted
+
+    def _submit(self, payload, topic):
+        if "control" in payload:
+            return self.control(payload.get("control"))
+        t_envio = payload.get("t_envio")
+        if self.max_age and isinstance(t_envio, (int, float)) and self.clock() - t_envio > self.max_age:
+            print(f"⌛ Mensaje vencido descartado: {payload.get('id') or payload.get('palabra')}")
+            return False
+        if "pasos" in payload:
+            return self.submit_plan(payload, topic)
+
+        modo = payload.get("modo")
+        if modo not in MODOS:
+            print(f"⚠️ Modo no reconocido: {modo}")
+            return False
+
+        palabra = payload.get("palabra", "")
+        if modo == "seña":
+            title = f"🤟 Ejecutando seña completa: {palabra}"
+            done = f"✅ Seña {palabra} completada.\n"
+        else:
+            title = f"🔠 Deletreando palabra: {palabra}"
+            done = f"✅ Deletreo completo de '{palabra}'\n"
+
+        owner = self.hand_for(topic)
+        steps = {name: [] for name in self.hands}
+        self._plan_word(owner, modo, palabra, steps)
+        return self._enqueue(owner, title, done, steps, payload, palabra)
+
+    # Plan: {"id": ..., "pasos": [{"orden", "modo", "palabra"}, ...]}.
+    # Todos los pasos van en un solo Job por mano, así ningún otro mensaje
+    # se intercala y el orden de las palabras se mantiene.
+    def submit_plan(self, payload, topic):
+        plan_id = payload.get("id", "")
+        pasos = payload.get("pasos")
+        if not isinstance(pasos, list):
+            print(f"⚠️ Plan {plan_id}: 'pasos' no es una lista")
+            return False
+        validos = []
+        for paso in pasos:
+            if not isinstance(paso, dict):
+                print(f"⚠️ Plan {plan_id}: paso inválido: {paso!r}")
+                continue
+            if not isinstance(paso.get("orden", 0), (int, float)):
+                print(f"⚠️ Plan {plan_id}: orden inválido: {paso.get('orden')!r}")
+                continue
+            validos.append(paso)
+        pasos = sorted(validos, key=lambda p: p.get("orden", 0))
+        owner = self.hand_for(topic)
+        steps = {name: [] for name in self.hands}
+        palabras = []
+        for paso in pasos:
+            modo = paso.get("modo")
+            if modo not in MODOS:
+                print(f"⚠️ Plan {plan_id}: modo no reconocido: {modo}")
+                continue
+            palabras.append(paso.get("palabra", ""))
+            self._plan_word(owner, modo, palabras[-1], steps)
+
+        frase = " ".join(palabras)
+        title = f"🧾 Ejecutando plan {plan_id}: {frase}"
+        done = f"✅ Plan {plan_id} completado.\n"
+        return self._enqueue(owner, title, done, steps, payload, frase)
+
+    # Agrega a `steps` los pasos de una palabra (seña completa o deletreo)
+    def _plan_word(self, owner, modo, palabra, steps):
+        owner_signs, _ = self.hands[owner]
+        tokens = owner_signs.plan(unidecode(palabra), spell=(modo == "deletreo"))
+
+        for token in tokens:
+            # Una seña es de dos manos si las dos tienen un archivo para ella
+            holders = [name for name, (signs, _) in self.hands.items() if token.key in signs]
+            if len(holders) > 1:
+                sync = JointSync(len(holders), self.joint_timeout)
+                for name in holders:
+                    signs, _ = self.hands[name]
+                    steps[name].append(Step(token.name, [signs[token.key]], sync=sync))
+                continue
+            # Si la otra mano está en otro equipo, se espera lo que le falta
+            # según la duración de su seña
+            wait = 0.0
+            if token.key in self.peer_signs:
+                wait = max(0.0, self.duration(self.peer_signs[token.key]) - self.duration(token.path))
+            steps[owner].append(Step(token.name, [token.path], wait=wait))
+
+    def _enqueue(self, owner, title, done, steps, payload, palabra):
+        priority = PRIORIDADES.get(payload.get("prioridad"), 0)
+        if priority > 0:
+            # Interrumpe lo que se está ejecutando con menor prioridad
+            self.cancel(lambda job: job.priority < priority, queued=False)
+        created = self.clock()
+        jobs = {}
+        for name, hand_steps in steps.items():
+            if not hand_steps:
+                continue
+            if name == owner:
+                jobs[name] = Job(title, done, hand_steps, payload, priority, created)
+            else:
+                jobs[name] = Job(None, None, hand_steps, payload, priority, created)
+        group = list(jobs.values())
+        for job in group:
+            job.group = group
+        for name, job in jobs.items():
+            if not self.queues[name].put(job, priority):
+                print(f"⚠️ Cola de la mano {name} llena, mensaje descartado: {palabra}")
+                # Sin esta parte las otras manos esperarían en vano en las
+                # señas de dos manos: se cancela el mensaje entero
+                self._cancel_group(job)
+                return False
+        return True
+
+    # La cola de `hand` sacó este trabajo para hacer lugar
+    def _dropped(self, hand, job):
+        print(f"⚠️ Cola de la mano {hand} llena, se descarta el más antiguo: {job.title or 'parte de otra mano'}")
+        self._emit("job_cancelled", hand, job)
+        self._cancel_group(job)
+
+    # Cancela todos los Jobs del mensaje de `job` y saca de las colas los
+    # que sigan pendientes
+    def _cancel_group(self, job):
+        for sibling in job.group:
+            sibling.cancel()
+        for name, q in self.queues.items():
+            for removed in q.discard(lambda queued: queued in job.group):
+                self._emit("job_cancelled", name, removed)
+
+    # Mensajes de control (tópico traductor/control)
+    def control(self, orden):
+        if orden not in CONTROLES:
+            print(f"⚠️ Control no reconocido: {orden}")
+            return False
+        cancelled = self.cancel()
+        print(f"⏹️ Stop: {cancelled} trabajos cancelados")
+        return True
+
+    # Cancela los trabajos que cumplen `match` (todos si es None): el que
+    # corre en cada mano y, con `queued`, los pendientes en las colas
+    def cancel(self, match=None, queued=True):
+        cancelled = 0
+        for name, q in self.queues.items():
+            job = self.current[name]
+            if job is not None and (match is None or match(job)) and not job.cancelled.is_set():
+                job.cancel()
+                cancelled += 1
+            if queued:
+                for job in q.discard(match):
+                    job.cancel()
+                    self._emit("job_cancelled", name, job)
+                    cancelled += 1
+        return cancelled
+
+    # True si el id del mensaje ya se vio dentro de la ventana
+    def _duplicate(self, payload):
+        message_id = payload.get("id")
+        if not message_id or not self.dedup_size:
+            return False
+        with self._lock:
+            seen = self._seen.get(message_id)
+        return seen is not None and self.clock() - seen <= self.dedup_window
+
+    # Registra el id de un mensaje aceptado
+    def _remember(self, payload):
+        message_id = payload.get("id")
+        if not message_id or not self.dedup_size:
+            return
+        with self._lock:
+            self._seen[message_id] = self.clock()
+            self._seen.move_to_end(message_id)
+            while len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+
+    def _emit(self, event, hand, job, step=None):
+        if self.on_event:
+            self.on_event(event, hand, job, step)
+
+    def _run_job(self, hand, job):
+        _, play = self.hands[hand]
+        if self.max_age and self.clock() - job.created > self.max_age:
+            # Esperó demasiado en la cola: la conversación ya siguió
+            if job.title:
+                print(f"⌛ Trabajo vencido descartado: {job.title}")
+            job.cancel()
+            self._emit("job_stale", hand, job)
+            return
+        self.current[hand] = job
+        try:
+            self._emit("job_start", hand, job)
+            if job.title:
+                print(job.title)
+            for step in job.steps:
+                if job.cancelled.is_set():
+                    print(f"⏹️ Mano {hand}: cancelado antes de '{step.name}'")
+                    self._emit("job_cancelled", hand, job)
+                    return
+                self._run_step(hand, play, job, step)
+            if job.done:
+                print(job.done)
+            self._emit("job_done", hand, job)
+        finally:
+            self.current[hand] = None
+
+    def _run_step(self, hand, play, job, step):
+        if step.sync:
+            try:
+                step.sync.start.wait()
+            except threading.BrokenBarrierError:
+                if not job.cancelled.is_set():
+                    print(f"⚠️ Mano {hand}: la otra mano no llegó a '{step.name}', se omite")
+                return
+        print(f"➡️ Mano {hand}: {step.name}")
+        self._emit("step_start", hand, job, step)
+        for f in step.files:
+            play(f)
+        self._emit("step_done", hand, job, step)
+        if step.sync:
+            try:
+                step.sync.end.wait()
+            except threading.BrokenBarrierError:
+                if not job.cancelled.is_set():
+                    print(f"⚠️ Mano {hand}: la otra mano no terminó '{step.name}'")
+        elif step.wait:
+            self.sleep(step.wait)
+        if self.step_pause:
+            self.sleep(self.step_pause)
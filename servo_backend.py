@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+from action_groups import parse_action_group
+from motion import SERVO_SPEED
+
+# Variable de entorno para elegir el backend: "learm" (por defecto) o "virtual"
+BACKEND_ENV = "SIGN2TALK_BACKEND"
+
+# Para el backend virtual: factor de escala del tiempo (0.01 = 100x más rápido)
+TIME_SCALE_ENV = "SIGN2TALK_TIME_SCALE"
+
+# Posición inicial de los servos
+HOME_POSITION = [0, 0, 0, 0, 0, 0]
+
+# Puerto serie del controlador LeArm; la librería lo abre al importarse
+LEARM_PORT = "/dev/ttyAMA0"
+LEARM_BAUDRATE = 9600
+
+
+# Backend real: la librería LeArm incluída en el dispositivo uHandPi.
+# Con `port` se maneja otro controlador (varias manos en un equipo, cada
+# una en su proceso): se reemplaza la conexión serie de la librería.
+class LeArmBackend:
+    name = "learm"
+
+    def __init__(self, home=HOME_POSITION, port=None):
+        import LeArm
+
+        self._learm = LeArm
+        if port and port != LEARM_PORT:
+            if not hasattr(LeArm, "serialHandle"):
+                raise ValueError(f"Esta versión de LeArm no permite elegir el puerto ({port})")
+            import serial
+
+            LeArm.serialHandle.close()
+            LeArm.serialHandle = serial.Serial(port, LEARM_BAUDRATE)
+        self.port = port or LEARM_PORT
+        self._learm.initLeArm(list(home))
+
+    def set_servo(self, servo, pulse, time_ms):
+        self._learm.setServo(servo, pulse, time_ms)
+
+    def run_action_group(self, path):
+        self._learm.runActionGroup(path, 1)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def now(self):
+        return time.monotonic()
+
+
+# Backend simulado: modela la velocidad de los servos y el tiempo de cada
+# movimiento, para ejecutar y medir la reproducción fuera de la Raspberry Pi
+class VirtualBackend:
+    name = "virtual"
+
+    def __init__(self, home=HOME_POSITION, speed=SERVO_SPEED, time_scale=1.0):
+        self.speed = speed
+        self.time_scale = time_scale
+        self.positions = list(home)
+        self._lock = threading.Lock()
+        self.moves = 0
+        self.late_ms = 0.0
+
+    # Registra el movimiento; si se pide más rápido de lo que el servo
+    # puede moverse, se acumula el retraso en `late_ms`
+    def set_servo(self, servo, pulse, time_ms):
+        with self._lock:
+            delta = abs(pulse - self.positions[servo - 1])
+            self.late_ms += max(0.0, delta / self.speed - time_ms)
+            self.positions[servo - 1] = pulse
+            self.moves += 1
+
+    def run_action_group(self, path):
+        group = parse_action_group(path)
+        for i in range(len(group)):
+            for servo, pulse in enumerate(group.frame(i), start=1):
+                self.set_servo(servo, pulse, group.times[i])
+            self.sleep(group.times[i] / 1000.0)
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def now(self):
+        return time.monotonic() / self.time_scale
+
+
+BACKENDS = {
+    LeArmBackend.name: LeArmBackend,
+    VirtualBackend.name: VirtualBackend,
+}
+
+
+# Crea el backend indicado, o el de la variable de entorno
+def create_backend(name=None, **kwargs):
+    name = name or os.environ.get(BACKEND_ENV, LeArmBackend.name)
+    if name not in BACKENDS:
+        raise ValueError(f"Backend no válido: {name} (opciones: {', '.join(BACKENDS)})")
+    if name == VirtualBackend.name and "time_scale" not in kwargs:
+        kwargs["time_scale"] = float(os.environ.get(TIME_SCALE_ENV, "1.0"))
+    return BACKENDS[name](**kwargs)
+
+
+_default_backend = None
+_default_lock = threading.Lock()
+
+
+# Backend compartido del proceso, creado la primera vez que se usa
+def get_backend():
+    global _default_backend
+    with _default_lock:
+        if _default_backend is None:
+            _default_backend = create_backend()
+        return _default_backend
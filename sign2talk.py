@@ -1,14 +1,22 @@
 import os
-import time
 import string
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
 
-# LeArm es una librería incluída en el dispositivo uHandPi
-from LeArm import runActionGroup, initLeArm
+from action_groups import ActionGroupCache
+from motion import MotionPlanner
+from servo_backend import get_backend
 
 # Directorio donde están los archivos .d6a
 SIGN_PATH = "/home/pi/uHand_Pi/ActionGroups/Letters"
 
-initLeArm([0, 0, 0, 0, 0, 0])
+# Variable de entorno con la carpeta de la copia de las señas de la otra
+# mano, cuando la maneja otro equipo
+PEER_SIGN_ENV = "SIGN2TALK_PEER_SIGNS"
+
+# Grupos de acciones ya leídos en memoria (se recargan si cambia el archivo)
+action_cache = ActionGroupCache()
 
 
 # Función para limpiar y normalizar texto
@@ -18,36 +26,168 @@ def normalize_text(text):
     return text.strip()
 
 
-# Cargar archivos disponibles
+# Prefijos de los archivos: señas completas y letras para deletrear
+WORD_PREFIX = "sign_"
+LETTER_PREFIX = "letter_"
+
+# Cantidad de frases ya resueltas que se guardan en memoria
+PHRASE_CACHE_SIZE = 256
+
+# Seña encontrada en el texto: clave del archivo, nombre y ruta
+SignToken = namedtuple("SignToken", ["key", "name", "path"])
+
+
+# Índice de señas: un dict clave -> ruta con dos tries precompilados
+# (señas completas y letras) para tokenizar una frase en una sola pasada
+# buscando siempre la coincidencia más larga ("ll", "rr", "te quiero").
+# Se construye una vez al cargar y no debe modificarse después.
+class SignIndex(dict):
+    def __init__(self, signs=(), cache_size=PHRASE_CACHE_SIZE):
+        super().__init__(signs)
+        self.cache_size = cache_size
+        self._words = {}
+        self._letters = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        for key, path in self.items():
+            if key.startswith(WORD_PREFIX):
+                name = " ".join(key[len(WORD_PREFIX):].replace("_", " ").split())
+                self._insert(self._words, name, SignToken(key, name, path))
+            elif key.startswith(LETTER_PREFIX):
+                name = key[len(LETTER_PREFIX):]
+                self._insert(self._letters, name, SignToken(key, name, path))
+
+    @staticmethod
+    def _insert(trie, name, token):
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[None] = token
+
+    # Coincidencia más larga desde `start`; con `whole_word` solo acepta
+    # coincidencias que terminan en un límite de palabra
+    @staticmethod
+    def _longest(trie, text, start, end, whole_word=False):
+        node = trie
+        best = None
+        i = start
+        while i < end and text[i] in node:
+            node = node[text[i]]
+            i += 1
+            if None in node and (not whole_word or i == end or text[i] == " "):
+                best = (node[None], i)
+        return best
+
+    # Convierte una frase en la secuencia de señas a ejecutar.
+    # Con `spell=True` se deletrea todo, sin buscar señas completas.
+    def plan(self, phrase, spell=False):
+        cache_key = (phrase, spell)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                return cached
+
+        text = " ".join(normalize_text(phrase).split())
+        sequence = []
+        i, n = 0, len(text)
+        while i < n:
+            if text[i] == " ":
+                i += 1
+                continue
+            # Si existe una seña completa para la(s) palabra(s) la usamos
+            match = None if spell else self._longest(self._words, text, i, n, True)
+            if match:
+                token, i = match
+                sequence.append(token)
+                continue
+            # Si no, deletreamos la palabra con los archivos de letras
+            word_end = text.find(" ", i)
+            word_end = n if word_end == -1 else word_end
+            while i < word_end:
+                match = self._longest(self._letters, text, i, word_end)
+                if match:
+                    token, i = match
+                    sequence.append(token)
+                else:
+                    i += 1
+
+        result = tuple(sequence)
+        with self._lock:
+            self._cache[cache_key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+
+# Cargar archivos disponibles y dejarlos leídos en memoria
 def load_signs(path):
-    return {
-        os.path.splitext(f)[0]: os.path.join(path, f)
+    signs = SignIndex(
+        (os.path.splitext(f)[0], os.path.join(path, f))
         for f in os.listdir(path)
         if f.endswith(".d6a")
-    }
+    )
+    action_cache.preload(signs.values())
+    return signs
+
+
+# Señas de la otra mano para HandScheduler(peer_signs=...). Si la carpeta
+# no está configurada o no existe, avisa y devuelve {}: las señas de dos
+# manos se ejecutan sin esperar a la otra mano, en vez de no arrancar.
+def load_peer_signs(path):
+    if not path or not os.path.isdir(path):
+        motivo = f"no existe {path}" if path else f"falta {PEER_SIGN_ENV}"
+        print(f"⚠️ Sin señas de la otra mano ({motivo}): las señas de dos manos no la esperarán")
+        return {}
+    return load_signs(path)
+
+
+# Duración (segundos) de una seña, calculada de sus cuadros. Pasa por la
+# caché, así refleja los cambios del archivo; 0 si no se puede leer.
+def sign_duration(path):
+    try:
+        return action_cache.get(path).duration
+    except (OSError, sqlite3.Error):
+        return 0.0
 
 
 # Función para mapear frase a archivos
 def phrase_to_signs(phrase, signs):
-    sequence = []
-    words = normalize_text(phrase).split()
-
-    for word in words:
-        # Si existe un archivo completo para la palabra (por ejemplo "sign_si")
-        full_key = f"sign_{word}"
-        if full_key in signs:
-            sequence.append(signs[full_key])
+    if not isinstance(signs, SignIndex):
+        signs = SignIndex(signs)
+    return [token.path for token in signs.plan(phrase)]
+
+
+# Reproductor de señas de una mano sobre un backend de servos
+# (LeArm en el uHandPi o el backend virtual)
+class SignPlayer:
+    def __init__(self, backend, cache=action_cache):
+        self.backend = backend
+        self.cache = cache
+        # Enlaza cada seña con la siguiente según la velocidad de los servos
+        self.planner = MotionPlanner(backend.set_servo, sleep=backend.sleep)
+
+    # Ejecuta la seña desde memoria; si el archivo no se puede leer,
+    # se usa la ejecución nativa del backend
+    def __call__(self, file_path):
+        print(f"Ejecutando seña: {file_path}")
+        try:
+            group = self.cache.get(file_path)
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ {file_path} no está en caché ({e}), usando runActionGroup")
+            self.backend.run_action_group(file_path)
+            self.planner.reset()
+            self.backend.sleep(1)
         else:
-            # Si no hay palabra completa, deletreamos con los archivos de letras
-            for letter in word:
-                letter_key = f"letter_{letter}"
-                if letter_key in signs:
-                    sequence.append(signs[letter_key])
-    return sequence
+            self.planner.play(group)
+
+
+_default_player = None
 
 
-# Ejecuta la seña usando la librería nativa de uHandPi
+# Ejecuta la seña con el backend por defecto del proceso
 def play_sign(file_path):
-    print(f"Ejecutando seña: {file_path}")
-    runActionGroup(file_path, 1)
-    time.sleep(1)
+    global _default_player
+    if _default_player is None:
+        _default_player = SignPlayer(get_backend())
+    _default_player(file_path)
@@ -0,0 +1,416 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import signal
+import ssl
+import time
+
+import paho.mqtt.client as mqtt
+
+from servo_backend import BACKEND_ENV, LEARM_PORT, LeArmBackend
+
+# Supervisor de varias manos en un mismo equipo. Una sola conexión MQTT
+# recibe los tópicos de todos los dispositivos y reparte cada mensaje a la
+# cola del proceso de su dispositivo. Cada proceso tiene su propio backend
+# de servos, su planificador y sus colas, así que una mano lenta o que
+# falla no frena a las demás; si un proceso muere o deja de reportar, se
+# reinicia.
+#
+# Uso:
+#   python supervisor.py --config devices.json
+
+CONFIG_FILE = "devices.json"
+STATUS_FILE = "supervisor_status.json"
+
+# Valores por defecto de cada dispositivo (los mismos de mqtt_subscriber)
+DEVICE_DEFAULTS = {
+    "backend": None,          # None: variable de entorno SIGN2TALK_BACKEND
+    "backend_options": {},
+    "env": {},
+    "peer_signs": None,       # señas de la otra mano si la maneja otro equipo
+    "inbox_size": 64,         # mensajes en espera hacia el proceso
+    "queue_size": 32,
+    "queue_policy": "drop_oldest",
+    "dedup_size": 256,
+    "dedup_window": 300,
+    "max_age": 60,
+    "trace_file": None,
+    "metrics_port": None,
+}
+
+HEARTBEAT_SEGUNDOS = 2.0      # cada cuánto reporta un proceso
+HEARTBEAT_LIMITE = 15.0       # sin reportes por más tiempo: se reinicia
+ARRANQUE_LIMITE = 120.0       # tiempo para cargar las señas y dar el primer reporte
+# Una mano está trabada si lleva en la misma fase (un paso o la espera entre
+# pasos) más de TRABADA_FACTOR veces lo esperado más TRABADA_MARGEN segundos
+TRABADA_FACTOR = 3.0
+TRABADA_MARGEN = 10.0
+REINICIO_MAX = 30.0           # espera máxima entre reinicios seguidos
+STATUS_SEGUNDOS = 30.0        # cada cuánto se imprime el estado
+
+
+def load_config(path):
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    devices = []
+    for device in config["devices"]:
+        merged = dict(DEVICE_DEFAULTS, **device)
+        if not merged.get("name") or not merged.get("hands") or not merged.get("topics"):
+            raise ValueError(f"Dispositivo incompleto (name, hands y topics): {device}")
+        devices.append(merged)
+    names = [d["name"] for d in devices]
+    if len(set(names)) != len(names):
+        raise ValueError("Los nombres de los dispositivos deben ser únicos")
+    # Dos dispositivos "learm" en el mismo puerto serie moverían el mismo
+    # brazo: cada uno necesita su "port" en backend_options
+    ports = {}
+    for d in devices:
+        if device_backend(d) == LeArmBackend.name:
+            ports.setdefault(d["backend_options"].get("port") or LEARM_PORT, []).append(d["name"])
+    for port, owners in ports.items():
+        if len(owners) > 1:
+            raise ValueError(f"Dispositivos learm en el mismo puerto {port}: {', '.join(owners)}")
+    return config["mqtt"], devices
+
+
+# Backend que usará el dispositivo, resuelto igual que create_backend
+def device_backend(device):
+    return (device["backend"] or device["env"].get(BACKEND_ENV)
+            or os.environ.get(BACKEND_ENV, LeArmBackend.name))
+
+
+# ==========================================
+# Proceso de un dispositivo
+# ==========================================
+def run_device(device, inbox, health):
+    # Ctrl+C lo maneja el supervisor, que avisa con None en la cola
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ.update(device["env"])
+
+    from scheduler import HandScheduler
+    from servo_backend import create_backend
+    from sign2talk import SignPlayer, load_peer_signs, load_signs, sign_duration
+    from tracing import Tracer
+
+    name = device["name"]
+    backend = create_backend(device["backend"], **device["backend_options"])
+    hand_signs = {hand: load_signs(path) for hand, path in device["hands"].items()}
+    peer_signs = load_peer_signs(device["peer_signs"]) if device["peer_signs"] else None
+    tracer = Tracer(device["trace_file"])
+    if device["metrics_port"]:
+        tracer.serve(device["metrics_port"])
+
+    stats = {"received": 0, "invalid": 0, "rejected": 0, "jobs_done": 0,
+             "jobs_cancelled": 0, "steps": 0, "last_done": None}
+    # Progreso de cada mano, actualizado desde su hilo: el trabajo que
+    # ejecuta, la fase actual, desde cuándo y cuánto debería durar. El
+    # heartbeat sale del loop principal, así que sin esto una mano trabada
+    # en play() o en una barrera seguiría pareciendo sana.
+    progress = {hand: None for hand in hand_signs}
+    jobs = {}
+
+    def on_event(event, hand, job, step):
+        tracer.on_event(event, hand, job, step)
+        if event == "step_done":
+            stats["steps"] += 1
+        elif event == "job_done" and job.title:
+            stats["jobs_done"] += 1
+            stats["last_done"] = time.time()
+        elif event in ("job_cancelled", "job_stale") and job.title:
+            stats["jobs_cancelled"] += 1
+
+        if event in ("job_start", "step_done"):
+            # Antes de cada paso puede esperar a la otra mano (hasta
+            # joint_timeout) y después del paso, lo que le falta a la otra
+            jobs[hand] = job
+            progress[hand] = {"phase": "espera", "step": step.name if step else None,
+                              "since": time.time(), "expected": scheduler.joint_timeout}
+        elif event == "step_start":
+            progress[hand] = {"phase": "paso", "step": step.name, "since": time.time(),
+                              "expected": sum(sign_duration(f) for f in step.files)}
+        elif event in ("job_done", "job_cancelled", "job_stale") and jobs.get(hand) is job:
+            jobs[hand] = None
+            progress[hand] = None
+
+    scheduler = HandScheduler(
+        hands={hand: (signs, SignPlayer(backend)) for hand, signs in hand_signs.items()},
+        topic_hands=device["topics"],
+        duration=sign_duration,
+        peer_signs=peer_signs,
+        queue_size=device["queue_size"],
+        policy=device["queue_policy"],
+        sleep=backend.sleep,
+        on_event=on_event,
+        dedup_size=device["dedup_size"],
+        dedup_window=device["dedup_window"],
+        max_age=device["max_age"],
+    )
+    scheduler.start()
+    print(f"🤖 [{name}] listo (pid {os.getpid()}, manos: {', '.join(hand_signs)})")
+
+    started = time.time()
+    next_beat = 0.0
+    while True:
+        now = time.monotonic()
+        if now >= next_beat:
+            next_beat = now + HEARTBEAT_SEGUNDOS
+            health.put({
+                "device": name,
+                "pid": os.getpid(),
+                "t": time.time(),
+                "uptime": time.time() - started,
+                "pending": sum(len(q) for q in scheduler.queues.values()),
+                "queue_dropped": sum(q.dropped for q in scheduler.queues.values()),
+                "busy": any(job is not None for job in scheduler.current.values()),
+                "hands": dict(progress),
+                **stats,
+            })
+
+        try:
+            item = inbox.get(timeout=max(0.0, next_beat - time.monotonic()))
+        except queue.Empty:
+            continue
+        if item is None:
+            break
+        topic, raw = item
+        stats["received"] += 1
+        try:
+            payload = json.loads(raw.decode())
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            stats["invalid"] += 1
+            print(f"⚠️ [{name}] Mensaje inválido en {topic}: {e}")
+            continue
+        if not isinstance(payload, dict):
+            stats["invalid"] += 1
+            continue
+        tracer.recibido(payload)
+        if not scheduler.submit(payload, topic):
+            stats["rejected"] += 1
+        tracer.encolado(payload)
+
+    scheduler.stop()
+    for worker in scheduler.workers.values():
+        worker.join(timeout=5)
+
+
+# ==========================================
+# Supervisor
+# ==========================================
+class DeviceHandle:
+    def __init__(self, ctx, device):
+        self.ctx = ctx
+        self.device = device
+        self.name = device["name"]
+        self.process = None
+        self.inbox = None
+        self.health = None
+        self.restarts = 0
+        self.routed = 0
+        self.dropped = 0
+        self.last_report = None
+        self.next_start = 0.0
+        self._backoff = 1.0
+
+    def start(self):
+        # Colas nuevas en cada arranque: las anteriores pueden quedar
+        # bloqueadas si el proceso murió mientras las usaba
+        self.inbox = self.ctx.Queue(self.device["inbox_size"])
+        self.health = self.ctx.Queue()
+        self.process = self.ctx.Process(
+            target=run_device, args=(self.device, self.inbox, self.health),
+            name=f"sign2talk-{self.name}", daemon=True,
+        )
+        self.process.start()
+        self.started_at = time.monotonic()
+        self.last_report = None
+
+    # Llamado desde el hilo de red MQTT: nunca bloquea
+    def route(self, topic, raw):
+        if self.inbox is None or not self.process.is_alive():
+            self.dropped += 1
+            return
+        try:
+            self.inbox.put_nowait((topic, raw))
+            self.routed += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def check(self, now):
+        if self.process is None:
+            return
+        alive = self.process.is_alive()
+        stuck = None
+        if self.last_report:
+            healthy = now - self.last_report["received_at"] <= HEARTBEAT_LIMITE
+            stuck = self.stuck_hand(now)
+        else:
+            healthy = now - self.started_at <= ARRANQUE_LIMITE
+        if alive and healthy and not stuck:
+            # Estable un rato: la espera entre reinicios vuelve a empezar
+            if self.last_report and self.last_report["uptime"] > HEARTBEAT_LIMITE:
+                self._backoff = 1.0
+            return
+        if self.next_start == 0.0:
+            if not alive:
+                reason = f"terminó (código {self.process.exitcode})"
+            elif stuck:
+                reason = stuck
+            else:
+                reason = "no responde"
+            print(f"💥 [{self.name}] {reason}; reinicio en {self._backoff:.0f}s")
+            if alive:
+                self.process.terminate()
+            self.next_start = now + self._backoff
+            self._backoff = min(REINICIO_MAX, self._backoff * 2)
+        elif now >= self.next_start:
+            self.next_start = 0.0
+            self.restarts += 1
+            self.start()
+
+    # Motivo si alguna mano lleva en su fase mucho más de lo esperado
+    def stuck_hand(self, now):
+        report = self.last_report
+        for hand, p in (report.get("hands") or {}).items():
+            if not p:
+                continue
+            elapsed = report["t"] - p["since"] + now - report["received_at"]
+            if elapsed > p["expected"] * TRABADA_FACTOR + TRABADA_MARGEN:
+                where = f"en '{p['step']}'" if p["phase"] == "paso" else "esperando entre pasos"
+                return f"mano {hand} trabada {where} hace {elapsed:.0f}s"
+        return None
+
+    def drain_health(self):
+        while self.health is not None:
+            try:
+                report = self.health.get_nowait()
+            except queue.Empty:
+                return
+            report["received_at"] = time.monotonic()
+            self.last_report = report
+
+    def stop(self, timeout=5.0):
+        if self.process is None or not self.process.is_alive():
+            return
+        try:
+            self.inbox.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def status(self):
+        report = dict(self.last_report or {})
+        report.pop("received_at", None)
+        return {
+            "device": self.name,
+            "alive": bool(self.process and self.process.is_alive()),
+            "restarts": self.restarts,
+            "routed": self.routed,
+            "dropped": self.dropped,
+            "report": report,
+        }
+
+
+class Supervisor:
+    def __init__(self, mqtt_config, devices):
+        self.mqtt_config = mqtt_config
+        # spawn: los procesos no heredan los hilos del cliente MQTT
+        self.ctx = mp.get_context("spawn")
+        self.devices = {d["name"]: DeviceHandle(self.ctx, d) for d in devices}
+        # filtro de tópico -> dispositivos que lo reciben
+        self.routes = {}
+        for device in devices:
+            for topic in device["topics"]:
+                self.routes.setdefault(topic, []).append(self.devices[device["name"]])
+        self.client = None
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            print("✅ Conectado correctamente al IoT Core")
+            for topic in self.routes:
+                client.subscribe(topic, qos=1)
+                print(f"📡 Suscrito al topic: {topic} -> "
+                      f"{', '.join(d.name for d in self.routes[topic])}")
+        else:
+            print(f"❌ Error de conexión: {rc}")
+
+    # Se reenvía el mensaje sin decodificar con el filtro que lo captó,
+    # que es la clave de `topics` en la configuración del dispositivo
+    def on_message(self, client, userdata, msg):
+        for topic, handles in self.routes.items():
+            if mqtt.topic_matches_sub(topic, msg.topic):
+                for handle in handles:
+                    handle.route(topic, msg.payload)
+
+    def connect(self):
+        config = self.mqtt_config
+        self.client = mqtt.Client(client_id=config.get("client_id", ""))
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.tls_set(
+            ca_certs=config["ca"],
+            certfile=config["cert"],
+            keyfile=config["key"],
+            tls_version=ssl.PROTOCOL_TLSv1_2,
+        )
+        print("🔄 Conectando al AWS IoT Core...")
+        self.client.connect_async(config["endpoint"], config.get("port", 8883))
+        self.client.loop_start()
+
+    def write_status(self, path=STATUS_FILE):
+        status = {"t": time.time(), "devices": [h.status() for h in self.devices.values()]}
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(status, f, indent=2)
+        os.replace(tmp, path)
+        return status
+
+    def print_status(self, status):
+        for d in status["devices"]:
+            r = d["report"]
+            print(f"📊 [{d['device']}] {'vivo' if d['alive'] else 'caído'} | "
+                  f"recibidos {r.get('received', 0)} pendientes {r.get('pending', 0)} "
+                  f"hechos {r.get('jobs_done', 0)} cancelados {r.get('jobs_cancelled', 0)} | "
+                  f"descartados {d['dropped']} reinicios {d['restarts']}")
+
+    def run(self):
+        for handle in self.devices.values():
+            handle.start()
+        self.connect()
+        next_status = time.monotonic() + STATUS_SEGUNDOS
+        try:
+            while True:
+                time.sleep(0.5)
+                now = time.monotonic()
+                for handle in self.devices.values():
+                    handle.drain_health()
+                    handle.check(now)
+                if now >= next_status:
+                    next_status = now + STATUS_SEGUNDOS
+                    self.print_status(self.write_status())
+        except KeyboardInterrupt:
+            print("🛑 Deteniendo dispositivos...")
+        finally:
+            if self.client:
+                self.client.loop_stop()
+                self.client.disconnect()
+            for handle in self.devices.values():
+                handle.stop()
+            self.write_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Supervisor de varias manos robóticas")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    args = parser.parse_args()
+
+    mqtt_config, devices = load_config(args.config)
+    print(f"🧩 {len(devices)} dispositivos: {', '.join(d['name'] for d in devices)}")
+    Supervisor(mqtt_config, devices).run()
+
+
+if __name__ == "__main__":
+    main()
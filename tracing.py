@@ -0,0 +1,136 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+# Trazas de latencia de punta a punta. Cada mensaje lleva un id de
+# correlación ("cid") y la hora de envío ("t_envio") desde la Lambda; aquí
+# se miden los tramos en la Raspberry Pi y se acumulan en histogramas que
+# se publican en /metrics (formato Prometheus) y en un archivo rotativo.
+
+# Límites de los histogramas, en milisegundos
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class Histograma:
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, ms):
+        i = 0
+        while i < len(self.buckets) and ms > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += ms
+
+
+# Tramos medidos por mensaje:
+#   transporte  t_envio (Lambda) -> llegada a la Pi (depende del reloj de ambos)
+#   resolver    llegada -> pasos encolados (decodificar, tokenizar, encolar)
+#   cola        llegada -> la mano empieza el mensaje
+#   seña        cada paso (play_sign de sus archivos)
+#   completo    llegada -> la mano dueña termina el mensaje
+#   total       t_envio -> la mano dueña termina el mensaje
+class Tracer:
+    def __init__(self, archivo=None, max_bytes=1 << 20, respaldos=3, reloj=time.time):
+        self.reloj = reloj
+        self.histogramas = {}
+        self._lock = threading.Lock()
+        self._pasos = {}
+        self._log = None
+        if archivo:
+            self._log = logging.getLogger(f"tracing.{archivo}")
+            self._log.propagate = False
+            self._log.setLevel(logging.INFO)
+            self._log.addHandler(RotatingFileHandler(archivo, maxBytes=max_bytes, backupCount=respaldos))
+
+    def span(self, nombre, cid, inicio, fin, **extra):
+        ms = (fin - inicio) * 1000
+        with self._lock:
+            histograma = self.histogramas.get(nombre)
+            if histograma is None:
+                histograma = self.histogramas[nombre] = Histograma()
+            histograma.observe(ms)
+        if self._log:
+            self._log.info(json.dumps({"cid": cid, "span": nombre, "t": inicio, "ms": round(ms, 2), **extra}))
+        return ms
+
+    # Llamar al recibir un mensaje: marca la llegada y asegura que tenga cid
+    def recibido(self, payload):
+        ahora = self.reloj()
+        if not payload.get("cid"):
+            payload["cid"] = uuid.uuid4().hex[:16]
+        payload["_recibido"] = ahora
+        t_envio = payload.get("t_envio")
+        if isinstance(t_envio, (int, float)):
+            self.span("transporte", payload["cid"], t_envio, ahora)
+        return ahora
+
+    def encolado(self, payload):
+        self.span("resolver", payload["cid"], payload["_recibido"], self.reloj())
+
+    # Para HandScheduler(on_event=tracer.on_event)
+    def on_event(self, evento, mano, job, paso):
+        payload = job.payload or {}
+        if "_recibido" not in payload:
+            return
+        cid = payload["cid"]
+        ahora = self.reloj()
+        if evento == "job_start" and job.title:
+            self.span("cola", cid, payload["_recibido"], ahora, mano=mano)
+        elif evento == "step_start":
+            self._pasos[mano] = ahora
+        elif evento == "step_done" and mano in self._pasos:
+            self.span("seña", cid, self._pasos.pop(mano), ahora, mano=mano, paso=paso.name)
+        elif evento == "job_done" and job.title:
+            self.span("completo", cid, payload["_recibido"], ahora, mano=mano)
+            t_envio = payload.get("t_envio")
+            if isinstance(t_envio, (int, float)):
+                self.span("total", cid, t_envio, ahora, mano=mano)
+
+    # Texto en formato de exposición de Prometheus
+    def metrics(self):
+        lineas = [
+            "# HELP sign2talk_latency_ms Latencia por tramo en milisegundos",
+            "# TYPE sign2talk_latency_ms histogram",
+        ]
+        with self._lock:
+            for nombre, h in sorted(self.histogramas.items()):
+                acumulado = 0
+                for limite, n in zip(h.buckets, h.counts):
+                    acumulado += n
+                    lineas.append(f'sign2talk_latency_ms_bucket{{span="{nombre}",le="{limite}"}} {acumulado}')
+                lineas.append(f'sign2talk_latency_ms_bucket{{span="{nombre}",le="+Inf"}} {h.count}')
+                lineas.append(f'sign2talk_latency_ms_sum{{span="{nombre}"}} {h.sum:.3f}')
+                lineas.append(f'sign2talk_latency_ms_count{{span="{nombre}"}} {h.count}')
+        return "\n".join(lineas) + "\n"
+
+    # Servidor HTTP local en un hilo: GET /metrics
+    def serve(self, port, host="0.0.0.0"):
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.metrics().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server